@@ -1,24 +1,46 @@
 # app.py
 # Para executar este aplicativo:
-# 1. Crie uma pasta chamada 'templates' no mesmo diretório deste arquivo.
-# 2. Salve todos os arquivos .html e o arquivo schema.sql dentro da pasta 'templates'.
-# 3. APAGUE o ficheiro 'livro_caixa.db' antigo, se ele existir.
-# 4. Instale o Flask: pip install Flask
-# 5. No terminal, execute: python app.py (isto irá criar um novo ficheiro .db com a estrutura correta)
-# 6. Abra seu navegador e acesse: http://127.0.0.1:5000
+# 1. Crie uma pasta chamada 'templates' no mesmo diretório deste arquivo e salve nela os arquivos .html.
+# 2. Mantenha a pasta 'migrations' (arquivos .sql numerados) ao lado deste arquivo.
+# 3. Instale as dependências: pip install -r requirements.txt
+# 4. No terminal, execute: python app.py (as migrações pendentes são aplicadas automaticamente)
+# 5. Abra seu navegador e acesse: http://127.0.0.1:5000
 
 import sqlite3
 import uuid
+import csv
+import html
+import io
+import re
+import string
+import calendar
+import itertools
+import math
+import multiprocessing
+import unicodedata
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 import copy
+import hashlib
+import json
+import hmac
+import secrets
+import gzip
+import shutil
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
-from functools import wraps
+from functools import wraps, total_ordering
+import click
+import numpy as np
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask import Flask, render_template, request, redirect, url_for, session, flash, g, jsonify, send_file
-from collections import defaultdict
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g, jsonify, abort, send_file, Response, stream_with_context, stream_template, has_request_context, before_render_template, template_rendered
+from collections import defaultdict, namedtuple, OrderedDict
+from xml.sax.saxutils import escape as xml_escape
 import os
+import threading
+import time
 
 # --- Configuração da Aplicação e Banco de Dados ---
-DATABASE = 'livro_caixa.db'
+DATABASE = os.environ.get('LIVRO_CAIXA_DB', 'livro_caixa.db')
 app = Flask(__name__)
 app.secret_key = 'sua-chave-secreta-super-segura-aqui'
 
@@ -50,50 +72,516 @@ DEFAULT_CATEGORIES = {
     ]
 }
 
+# --- Conexões com o Banco de Dados ---
+DB_POOL_SIZE = 8
+DB_POOL_TIMEOUT = 10  # segundos à espera de uma conexão livre
+DB_CACHE_SIZE_KB = 16384
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_BUSY_TIMEOUT_MS = 5000
+DB_STATEMENT_CACHE = 256
+
+def connect_db(database=None):
+    """Abre uma conexão já configurada: WAL, synchronous=NORMAL, cache, mmap e busy_timeout."""
+    db = sqlite3.connect(
+        database or DATABASE,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=DB_STATEMENT_CACHE
+    )
+    db.row_factory = sqlite3.Row
+    db.execute('PRAGMA journal_mode = WAL')
+    db.execute('PRAGMA synchronous = NORMAL')
+    db.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+    db.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+    db.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+    return db
+
+class ConnectionPool:
+    """Pool de conexões SQLite por processo, seguro para threads.
+
+    As conexões são abertas sob demanda até `size` e reaproveitadas entre requisições,
+    mantendo o cache de páginas e as instruções preparadas de cada uma.
+    """
+
+    def __init__(self, database, size):
+        self.database = database
+        self.size = size
+        self.pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+
+    def acquire(self, timeout=DB_POOL_TIMEOUT):
+        with self._available:
+            if not self._idle and self._created >= self.size:
+                self._waits += 1
+                if not self._available.wait_for(lambda: self._idle, timeout):
+                    raise RuntimeError("Nenhuma conexão com o banco de dados disponível.")
+            if self._idle:
+                db = self._idle.pop()
+            else:
+                db = None
+                self._created += 1
+            self._in_use += 1
+            self._acquired += 1
+        if db is None:
+            try:
+                db = connect_db(self.database)
+            except Exception:
+                with self._available:
+                    self._created -= 1
+                    self._in_use -= 1
+                    self._available.notify()
+                raise
+        return db
+
+    def release(self, db):
+        if db.in_transaction:
+            db.rollback()
+        with self._available:
+            self._in_use -= 1
+            self._idle.append(db)
+            self._available.notify()
+
+    def close(self):
+        with self._available:
+            for db in self._idle:
+                db.close()
+            self._created -= len(self._idle)
+            self._idle.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'acquired_total': self._acquired,
+                'waits_total': self._waits,
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Devolve o pool deste processo, criando um novo após um fork (workers do gunicorn)."""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(DATABASE, DB_POOL_SIZE)
+    return _pool
+
 def get_db():
-    """Abre uma nova conexão com o banco de dados se não houver uma."""
+    """Obtém uma conexão do pool para a requisição atual, se ainda não houver uma."""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = g._database = get_pool().acquire()
+        if INSTRUMENTATION_ENABLED and has_request_context():
+            db = g._database = InstrumentedConnection(db, request_metrics())
     return db
 
 @app.teardown_appcontext
 def close_connection(exception):
-    """Fecha a conexão com o banco de dados ao final da requisição."""
-    db = getattr(g, '_database', None)
+    """Devolve a conexão ao pool ao final da requisição."""
+    db = g.pop('_database', None)
     if db is not None:
+        get_pool().release(getattr(db, 'connection', db))
+
+# --- Instrumentação (consultas, templates e tempos por requisição) ---
+# Desligada por omissão; com LIVRO_CAIXA_METRICS=1 cada requisição mede as consultas e o
+# render dos templates, devolve um cabeçalho Server-Timing e alimenta os histogramas de /metrics.
+INSTRUMENTATION_ENABLED = os.environ.get('LIVRO_CAIXA_METRICS') == '1'
+METRICS_TOKEN = os.environ.get('LIVRO_CAIXA_METRICS_TOKEN')
+SLOW_QUERY_MS = 100
+N_PLUS_ONE_THRESHOLD = 10  # mesma instrução repetida este número de vezes numa requisição
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+class RequestMetrics:
+    """Custos acumulados de uma requisição: consultas, tempo no banco e tempo de templates."""
+    __slots__ = ('started', 'queries', 'db_time', 'template_time', 'statements', 'slow', '_template_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = defaultdict(int)
+        self.slow = []
+        self._template_started = []
+
+    def record(self, sql, elapsed, executed=True):
+        if executed:
+            self.queries += 1
+            self.statements[sql] += 1
+        self.db_time += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            self.slow.append((sql, elapsed))
+
+    def repeated_statements(self):
+        """Instruções repetidas N_PLUS_ONE_THRESHOLD vezes ou mais: provável padrão N+1."""
+        return [(sql, count) for sql, count in self.statements.items() if count >= N_PLUS_ONE_THRESHOLD]
+
+def request_metrics():
+    metrics = getattr(g, '_request_metrics', None)
+    if metrics is None:
+        metrics = g._request_metrics = RequestMetrics()
+    return metrics
+
+class InstrumentedCursor:
+    """Cursor que soma o tempo de execute e dos fetch à instrução que o originou."""
+    __slots__ = ('_cursor', '_metrics', '_sql')
+
+    def __init__(self, cursor, metrics):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_metrics', metrics)
+        object.__setattr__(self, '_sql', None)
+
+    def _timed(self, sql, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._metrics.record(sql, time.perf_counter() - started, executed=method.__name__.startswith('execute'))
+
+    def execute(self, sql, parameters=()):
+        object.__setattr__(self, '_sql', sql)
+        self._timed(sql, self._cursor.execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        object.__setattr__(self, '_sql', sql)
+        self._timed(sql, self._cursor.executemany, sql, seq_of_parameters)
+        return self
+
+    def fetchone(self):
+        return self._timed(self._sql, self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed(self._sql, self._cursor.fetchmany, size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._timed(self._sql, self._cursor.fetchall)
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(256)
+            if not rows:
+                return
+            yield from rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+class InstrumentedConnection:
+    """Envolve a conexão do pool da requisição, medindo cada instrução executada por ela."""
+
+    def __init__(self, connection, metrics):
+        self.connection = connection
+        self.metrics = metrics
+
+    def cursor(self):
+        return InstrumentedCursor(self.connection.cursor(), self.metrics)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus, com um conjunto de séries por endpoint."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            counts, total = self._series.get(label, ([0] * (len(self.buckets) + 1), 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._series[label] = (counts, total + value)
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label, (counts, total) in sorted(self._series.items()):
+                for bound, count in zip((*self.buckets, '+Inf'), counts):
+                    lines.append(f'{self.name}_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_sum{{endpoint="{label}"}} {total:.6f}')
+                lines.append(f'{self.name}_count{{endpoint="{label}"}} {counts[-1]}')
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, label, amount=1):
+        with self._lock:
+            self._values[label] += amount
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{endpoint="{label}"}} {value}')
+        return lines
+
+# Métricas deste worker (cada worker do gunicorn expõe as suas).
+METRICS = (
+    Histogram('livro_caixa_request_duration_seconds', 'Tempo total da requisição.', DURATION_BUCKETS),
+    Histogram('livro_caixa_db_duration_seconds', 'Tempo gasto em consultas SQL por requisição.', DURATION_BUCKETS),
+    Histogram('livro_caixa_template_duration_seconds', 'Tempo de render de templates por requisição.', DURATION_BUCKETS),
+    Histogram('livro_caixa_queries_per_request', 'Número de instruções SQL por requisição.', QUERY_COUNT_BUCKETS),
+    Counter('livro_caixa_slow_queries_total', f'Instruções SQL com {SLOW_QUERY_MS} ms ou mais.'),
+    Counter('livro_caixa_n_plus_one_total', f'Requisições com uma instrução repetida {N_PLUS_ONE_THRESHOLD}+ vezes.'),
+)
+(request_duration, db_duration, template_duration, queries_per_request, slow_queries, n_plus_one) = METRICS
+
+def template_started(sender, template, context, **extra):
+    request_metrics()._template_started.append(time.perf_counter())
+
+def template_finished(sender, template, context, **extra):
+    metrics = request_metrics()
+    if metrics._template_started:
+        metrics.template_time += time.perf_counter() - metrics._template_started.pop()
+
+def add_server_timing(response):
+    """Cabeçalho Server-Timing com o tempo no banco, nos templates e o total até aqui."""
+    metrics = getattr(g, '_request_metrics', None)
+    if metrics is not None:
+        total = time.perf_counter() - metrics.started
+        response.headers['Server-Timing'] = (
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} consultas", '
+            f'tpl;dur={metrics.template_time * 1000:.1f}, total;dur={total * 1000:.1f}'
+        )
+    return response
+
+def record_request_metrics(exception):
+    """Fecha as métricas da requisição (depois do streaming, se houver) nos histogramas."""
+    metrics = g.pop('_request_metrics', None)
+    if metrics is None:
+        return
+    endpoint = request.endpoint or 'desconhecido'
+    request_duration.observe(endpoint, time.perf_counter() - metrics.started)
+    db_duration.observe(endpoint, metrics.db_time)
+    template_duration.observe(endpoint, metrics.template_time)
+    queries_per_request.observe(endpoint, metrics.queries)
+    for sql, elapsed in metrics.slow:
+        slow_queries.inc(endpoint)
+        app.logger.warning("Consulta lenta em %s (%.0f ms): %s", endpoint, elapsed * 1000, ' '.join(sql.split()))
+    repeated = metrics.repeated_statements()
+    if repeated:
+        n_plus_one.inc(endpoint)
+        for sql, count in repeated:
+            app.logger.warning("Possível N+1 em %s: %d execuções de %s", endpoint, count, ' '.join(sql.split()))
+
+def start_request_metrics():
+    request_metrics()
+
+if INSTRUMENTATION_ENABLED:
+    app.before_request(start_request_metrics)
+    app.after_request(add_server_timing)
+    app.teardown_request(record_request_metrics)
+    before_render_template.connect(template_started, app)
+    template_rendered.connect(template_finished, app)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def split_sql_statements(script):
+    """Divide um script SQL em instruções completas (respeitando corpos de triggers)."""
+    statements, buffer = [], ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statement = buffer.strip()
+            if statement.rstrip(';').strip():
+                statements.append(statement)
+            buffer = ''
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+def list_migrations():
+    """Lista as migrações disponíveis como (versão, nome, caminho), em ordem."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if filename.endswith('.sql') and filename[:4].isdigit():
+            migrations.append((int(filename[:4]), filename, os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+def migrate(database=None):
+    """Aplica as migrações pendentes e devolve os nomes das que foram aplicadas.
+
+    Cada migração roda numa transação `BEGIN IMMEDIATE`, e a versão é relida já com o
+    bloqueio de escrita obtido, de modo que vários workers do gunicorn iniciando ao mesmo
+    tempo aplicam cada migração exatamente uma vez.
+    """
+    db = sqlite3.connect(database or DATABASE, isolation_level=None, timeout=30)
+    applied = []
+    try:
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS schema_version ('
+            'version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)'
+        )
+        for version, name, path in list_migrations():
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                if db.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone():
+                    db.execute('COMMIT')
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    for statement in split_sql_statements(f.read()):
+                        db.execute(statement)
+                db.execute(
+                    'INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                    (version, name, datetime.now().isoformat(timespec='seconds'))
+                )
+                db.execute('COMMIT')
+                applied.append(name)
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+    finally:
         db.close()
+    return applied
 
 def init_db():
-    """Inicializa o banco de dados com o schema definido."""
-    with app.app_context():
-        db = get_db()
-        with app.open_resource('templates/schema.sql', mode='r') as f:
-            db.cursor().executescript(f.read())
-        db.commit()
-        
-        cursor = db.cursor()
-        cursor.execute("SELECT * FROM users WHERE username = ?", ('admin',))
-        if cursor.fetchone() is None:
-            admin_password = generate_password_hash('admin')
-            cursor.execute(
-                "INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)",
-                ('admin', 'artenio.reis@gmail.com', admin_password, 'admin')
-            )
-            db.commit()
-            
-            admin_user = cursor.execute("SELECT id FROM users WHERE username = ?", ('admin',)).fetchone()
-            if admin_user:
-                admin_id = admin_user['id']
-                for group, categories in DEFAULT_CATEGORIES.items():
-                    for category_name in categories:
-                        cursor.execute(
-                            "INSERT INTO categories (user_id, name, category_group) VALUES (?, ?, ?)",
-                            (admin_id, category_name, group)
-                        )
-                db.commit()
+    """Aplica as migrações do schema e garante a existência do usuário 'admin'."""
+    for name in migrate():
+        print(f"Migração aplicada: {name}")
+
+    # Conexão própria, fora do pool: com `gunicorn --preload` esta função roda no processo
+    # mestre, e conexões abertas antes do fork não devem ser herdadas pelos workers.
+    db = connect_db()
+    try:
+        if db.execute("SELECT 1 FROM users WHERE username = ?", ('admin',)).fetchone() is not None:
+            return
+
+        # INSERT OR IGNORE: se outro worker criou o admin ao mesmo tempo, nada é feito aqui.
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)",
+            ('admin', 'artenio.reis@gmail.com', generate_password_hash('admin', PASSWORD_HASH_METHOD), 'admin')
+        )
+        if cursor.rowcount == 1:
+            admin_id = cursor.lastrowid
+            for group, categories in DEFAULT_CATEGORIES.items():
+                for category_name in categories:
+                    db.execute(
+                        "INSERT INTO categories (user_id, name, category_group) VALUES (?, ?, ?)",
+                        (admin_id, category_name, group)
+                    )
             print("Banco de dados inicializado e usuário 'admin' criado com categorias padrão.")
+        db.commit()
+    finally:
+        db.close()
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Aplica as migrações pendentes do banco de dados."""
+    applied = migrate()
+    print(f"{len(applied)} migração(ões) aplicada(s).")
+
+def query_plan_checks():
+    """Consultas de cada rota, conferidas por `flask check-query-plans`.
+
+    Montadas com as mesmas constantes e funções que as rotas usam (com parâmetros de
+    exemplo), para que a conferência acompanhe o SQL que de fato roda. Os relatórios
+    entram também na forma que lê o arquivo (`archive_sql`). Cada consulta traz os
+    índices que o plano precisa usar ('INTEGER PRIMARY KEY' para a busca por id).
+    """
+    period = (1, '2025-01-01', '2025-01-31')
+    ledger_by_date = ('idx_transactions_user_date',)
+    ledger_by_due_date = ('idx_transactions_user_due_date',)
+    archive_by_date = ('idx_transactions_archive_user_date',)
+    archive_by_due_date = ('idx_transactions_archive_user_due_date',)
+    checks = [
+        ('index', DASHBOARD_SQL, ('2025-01', 1, TRANSFER_GROUP), ('PRIMARY KEY',)),
+        ('lancamentos', *ledger_page_query(TRANSACTION_SELECT, 1, {'filter_type': 'despesa', 'cursor': '2025-01-01:10'}, LANCAMENTOS_PAGE_SIZE),
+         ledger_by_due_date),
+        ('search_transactions', *search_page_query(1, {'filter_status': 'pendente'}, '"aluguel"*', 1, LANCAMENTOS_PAGE_SIZE),
+         ('transactions_fts', 'INTEGER PRIMARY KEY')),
+        ('reports', REPORT_SQL, period, ledger_by_date),
+        ('reports (arquivo)', archive_sql(REPORT_SQL), period, ledger_by_date + archive_by_date),
+        ('detailed_report', DETAILED_REPORT_SQL, detailed_report_params(*period), ledger_by_date + ledger_by_due_date),
+        ('detailed_report (arquivo)', archive_sql(DETAILED_REPORT_SQL), detailed_report_params(*period),
+         ledger_by_date + ledger_by_due_date + archive_by_date + archive_by_due_date),
+        ('cash_book', CASH_BOOK_SQL, period, ledger_by_date),
+        ('cash_book (arquivo)', archive_sql(CASH_BOOK_SQL), period, ledger_by_date + archive_by_date),
+        ('reaches_archive', REACHES_ARCHIVE_SQL, (1, '2025-01-01', 1, '2025-01-01'), archive_by_date + archive_by_due_date),
+        ('recurring_rules', 'SELECT 1 FROM recurring_rules ' + RECURRING_PENDING_WHERE + ' LIMIT 1', (1, '2025-01-31'),
+         ('idx_recurring_rules_user',)),
+        ('account_balances', ACCOUNT_BALANCES_SQL, (1, 1), ('idx_accounts_user_name', 'idx_credit_cards_user_name')),
+        ('add_transfer', NEXT_TRANSFER_ID_SQL, (), ()),
+        ('import_history', DESCRIPTION_HISTORY_SQL, (1, '["aluguel"]'), ('idx_transactions_user_description',)),
+        ('cadastro', "SELECT * FROM categories WHERE user_id = ? ORDER BY name", (1,), ('idx_categories_user_name',)),
+        ('api_transactions', *ledger_page_query(API_TRANSACTION_SELECT, 1, {'cursor': '2025-01-01:10'}, API_PAGE_SIZE),
+         ledger_by_due_date),
+        ('api_sync', API_SYNC_SQL, (1, '2025-01-01T00:00:00.000Z', 0, API_PAGE_SIZE + 1), ('idx_transactions_user_updated_at',)),
+        ('api_changes', API_CHANGES_SQL, (1, 0, API_PAGE_SIZE + 1), ('idx_changes_user_seq',)),
+        ('api_changes (lançamentos)', API_CHANGED_TRANSACTIONS_SQL, (1, '[1, 2]'), ('INTEGER PRIMARY KEY',)),
+        ('session', SESSION_USER_SQL, (1,), ('INTEGER PRIMARY KEY',)),
+        ('session (revogações)', SESSION_REVOCATIONS_SQL, (0,), ('INTEGER PRIMARY KEY',)),
+        ('login', "SELECT * FROM users WHERE username = ?", ('admin',), ('sqlite_autoindex_users_1',)),
+        ('reset_password', "SELECT * FROM users WHERE reset_token = ?", ('x',), ('idx_users_reset_token',)),
+    ]
+    for item_type, column in ITEM_USAGE_COLUMNS.items():
+        for table, sql in item_usage_queries(item_type, column).items():
+            checks.append((f'delete_item ({item_type}, {table})', sql, (1,), (f'idx_{table}_{column[:-len("_id")]}',)))
+    return checks
+
+def query_plan_problems(db, sql, params, expected):
+    """Problemas do EXPLAIN QUERY PLAN de `sql`: índices esperados que não aparecem, tabelas
+    percorridas inteiras (SCAN sem índice ou SEARCH sem USING, como um MAX() que nenhum
+    índice atende) e buscas só por (user_id=?), que leem todo o histórico do usuário, fora
+    dos índices esperados."""
+    plan = [row[3] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+    problems = [f"não usa {name}" for name in expected if not any(name in step for step in plan)]
+    for step in plan:
+        if step.startswith('SCAN ') and 'INDEX' not in step and step != 'SCAN CONSTANT ROW':
+            problems.append(step)
+        elif step.startswith('SEARCH ') and ' USING ' not in step:
+            problems.append(step)
+        elif step.endswith('(user_id=?)') and not any(name in step for name in expected):
+            problems.append(step)
+    return problems
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Confere com EXPLAIN QUERY PLAN que as consultas das rotas usam índices."""
+    db = get_db()
+    failures = 0
+    for route, sql, params, expected in query_plan_checks():
+        problems = query_plan_problems(db, sql, params, expected)
+        if problems:
+            failures += 1
+            print(f"[FALHA] {route}: {'; '.join(problems)}")
+        else:
+            print(f"[OK] {route}")
+    if failures:
+        raise SystemExit(1)
 
 # --- Funções Auxiliares e Decorators ---
 def parse_date(date_val):
@@ -102,13 +590,198 @@ def parse_date(date_val):
     try: return datetime.strptime(date_val, '%Y-%m-%d')
     except (ValueError, TypeError): return None
 
+@total_ordering
+class Money:
+    """Valor monetário em centavos inteiros; é assim que os valores ficam gravados no banco."""
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        self.cents = int(cents)
+
+    @classmethod
+    def parse(cls, text):
+        """Converte o texto de um formulário ('12.34' ou '12,34') em Money, arredondando ao centavo."""
+        try:
+            value = Decimal(str(text).strip().replace(',', '.'))
+        except InvalidOperation:
+            raise ValueError(f"Valor inválido: {text!r}")
+        if not value.is_finite():
+            raise ValueError(f"Valor inválido: {text!r}")
+        return cls(int((value * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP)))
+
+    @staticmethod
+    def _cents_of(other):
+        """Inteiros são tratados como centavos, como no banco (e `sum()` começa em 0)."""
+        if isinstance(other, Money): return other.cents
+        if isinstance(other, int): return other
+        return NotImplemented
+
+    def __add__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is NotImplemented else Money(self.cents + cents)
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is NotImplemented else Money(self.cents - cents)
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __eq__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is NotImplemented else self.cents == cents
+
+    def __lt__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is NotImplemented else self.cents < cents
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __float__(self):
+        return self.cents / 100
+
+    def __str__(self):
+        sign = '-' if self.cents < 0 else ''
+        whole, frac = divmod(abs(self.cents), 100)
+        return f"{sign}{whole}.{frac:02d}"
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+@app.template_filter('money')
+def money_filter(value):
+    """Formata Money ou centavos inteiros (como vêm do banco) com duas casas decimais."""
+    if value is None: return ''
+    return str(value if isinstance(value, Money) else Money(value))
+
+@app.template_filter('br_date')
+def br_date(date_str):
+    """Formata 'AAAA-MM-DD' como 'DD/MM/AAAA' sem passar por datetime."""
+    if not date_str: return ''
+    return f"{date_str[8:10]}/{date_str[5:7]}/{date_str[0:4]}"
+
+# --- Validação de Sessão ---
+SESSION_CACHE_TTL = 60  # segundos
+SESSION_CACHE_SIZE = 1024
+SESSION_REVOCATION_CHECK_INTERVAL = 1  # segundos: atraso máximo de uma revogação feita em outro worker
+
+class TTLCache:
+    """Cache LRU em memória, seguro para threads, com expiração por entrada."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+SessionUser = namedtuple('SessionUser', ['username', 'role', 'session_generation'])
+SESSION_USER_SQL = 'SELECT username, role, session_generation FROM users WHERE id = ?'
+SESSION_REVOCATIONS_SQL = 'SELECT seq, user_id FROM session_revocations WHERE seq > ? ORDER BY seq'
+
+session_cache = TTLCache(SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
+# Última revogação (session_revocations.seq) vista por este worker e quando ela foi lida.
+_revocation_seen = None
+_revocation_checked_at = float('-inf')
+_revocation_lock = threading.Lock()
+
+def sync_revocations(db):
+    """Descarta do cache os usuários revogados em outros workers desde a última leitura.
+
+    Lê session_revocations no máximo a cada SESSION_REVOCATION_CHECK_INTERVAL segundos; nas
+    demais requisições o cache responde sem consultar o banco.
+    """
+    global _revocation_seen, _revocation_checked_at
+    if time.monotonic() - _revocation_checked_at < SESSION_REVOCATION_CHECK_INTERVAL:
+        return
+    with _revocation_lock:
+        now = time.monotonic()
+        if now - _revocation_checked_at < SESSION_REVOCATION_CHECK_INTERVAL:
+            return
+        if _revocation_seen is None:
+            # Primeira leitura do worker: o cache ainda está vazio, basta saber onde começar.
+            _revocation_seen = db.execute('SELECT COALESCE(MAX(seq), 0) FROM session_revocations').fetchone()[0]
+        else:
+            for seq, user_id in db.execute(SESSION_REVOCATIONS_SQL, (_revocation_seen,)):
+                session_cache.invalidate(user_id)
+                _revocation_seen = seq
+        _revocation_checked_at = now
+
+def load_session_user(db, user_id):
+    """Devolve o SessionUser do usuário (do cache ou por chave primária) ou None se não existir."""
+    sync_revocations(db)
+    user = session_cache.get(user_id)
+    if user is None:
+        row = db.execute(SESSION_USER_SQL, (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = SessionUser(*row)
+        session_cache.set(user_id, user)
+    return user
+
+def revoke_sessions(db, user_id, bump_user=True):
+    """Invalida as sessões de um usuário em todos os workers (o commit fica com quem chama)."""
+    if bump_user:
+        db.execute('UPDATE users SET session_generation = session_generation + 1 WHERE id = ?', (user_id,))
+    db.execute(
+        "INSERT INTO session_revocations (user_id, revoked_at) VALUES (?, datetime('now'))", (user_id,)
+    )
+    db.execute("DELETE FROM session_revocations WHERE revoked_at < datetime('now', '-1 day')")
+    session_cache.invalidate(user_id)
+
+def start_session(user):
+    session.clear()
+    session['user_id'] = user['id']
+    session['username'] = user['username']
+    session['role'] = user['role']
+    session['session_generation'] = user['session_generation']
+
+def session_is_valid():
+    user = load_session_user(get_db(), session['user_id'])
+    return (
+        user is not None
+        and user.username == session.get('username')
+        and user.session_generation == session.get('session_generation', 0)
+    )
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             flash("Por favor, faça login para acessar esta página.", "warning")
             return redirect(url_for('login'))
-        if session['username'] not in [row['username'] for row in get_db().execute('SELECT username FROM users').fetchall()]:
+        if not session_is_valid():
             flash("Sua sessão é inválida. Por favor, faça login novamente.", "danger")
             session.clear()
             return redirect(url_for('login'))
@@ -120,12 +793,360 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return redirect(url_for('login'))
+        if not session_is_valid():
+            flash("Sua sessão é inválida. Por favor, faça login novamente.", "danger")
+            session.clear()
+            return redirect(url_for('login'))
         if session.get('role') != 'admin':
             flash("Você não tem permissão para acessar esta página.", "danger")
             return redirect(url_for('index'))
         return f(*args, **kwargs)
     return decorated_function
 
+# --- Cache de Relatórios ---
+REPORT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+class ReportCache:
+    """Cache LRU de páginas renderizadas, seguro para threads, limitado pelo total de bytes.
+
+    Cada entrada guarda o ETag com que foi gerada; se o ETag atual for outro (os dados
+    do usuário mudaram), a entrada é descartada na leitura.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, etag):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] != etag:
+                if item is not None:
+                    self._size -= len(self._data.pop(key)[1])
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return item[1]
+
+    def set(self, key, etag, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._data[key] = (etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._size -= len(self._data.popitem(last=False)[1][1])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self._size, 'hits': self._hits, 'misses': self._misses}
+
+report_cache = ReportCache(REPORT_CACHE_MAX_BYTES)
+
+def data_version(db, user_id):
+    """Contador incrementado por gatilhos a cada escrita nos dados do usuário (migração 0009)."""
+    row = db.execute('SELECT data_version FROM users WHERE id = ?', (user_id,)).fetchone()
+    return row['data_version'] if row else 0
+
+def cached_report(cache_params):
+    """Serve a página do cache por (user_id, rota, parâmetros), com ETag e resposta 304.
+
+    `cache_params` devolve os parâmetros que determinam o resultado da rota. O ETag junta
+    esses parâmetros à versão dos dados e ao usuário da sessão (mostrado no layout), então
+    um navegador com a página atual recebe 304 sem que nada seja consultado nem renderizado.
+    Com mensagens flash pendentes a página é sempre renderizada, para exibi-las.
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if session.get('_flashes'):
+                return view(*args, **kwargs)
+            user_id = session['user_id']
+            key = (user_id, request.endpoint, tuple(cache_params()))
+            version = data_version(get_db(), user_id)
+            etag = hashlib.sha1(repr((key, version, session.get('username'), session.get('role'))).encode()).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                body = report_cache.get(key, etag)
+                if body is None:
+                    body = view(*args, **kwargs)
+                    report_cache.set(key, etag, body)
+                response = app.make_response(body)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+# --- Agregações do Dashboard ---
+DASHBOARD_MONTHS = 6
+
+DashboardSummary = namedtuple('DashboardSummary', [
+    'total_income', 'total_expense', 'total_pending_income', 'total_pending_expense',
+    'balance', 'expenses_by_category', 'monthly_flow'
+])
+
+def month_keys(today, months):
+    """Devolve as chaves 'AAAA-MM' dos últimos `months` meses, do mais antigo ao atual."""
+    year, month = today.year, today.month
+    keys = []
+    for _ in range(months):
+        keys.append(f"{year:04d}-{month:02d}")
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return keys[::-1]
+
+DASHBOARD_SQL = """
+    SELECT c.name AS category,
+           CASE WHEN s.month >= ? THEN s.month END AS month,
+           SUM(CASE WHEN s.type = 'receita' AND s.status IN ('pago', 'recebido') THEN s.total ELSE 0 END) AS income,
+           SUM(CASE WHEN s.type = 'despesa' AND s.status = 'pago' THEN s.total ELSE 0 END) AS expense,
+           SUM(CASE WHEN s.type = 'receita' AND s.status = 'pendente' THEN s.total ELSE 0 END) AS pending_income,
+           SUM(CASE WHEN s.type = 'despesa' AND s.status = 'pendente' THEN s.total ELSE 0 END) AS pending_expense
+    FROM monthly_summary s
+    JOIN categories c ON c.id = s.category_id
+    WHERE s.user_id = ? AND c.category_group != ?
+    GROUP BY s.category_id, month
+"""
+
+def compute_dashboard(db, user_id, today):
+    """Calcula todos os indicadores do dashboard a partir do resumo mensal.
+
+    A agregação condicional produz, por categoria e mês, as somas de cada combinação
+    tipo/status; o mês só é mantido para os meses da janela do gráfico, de modo que a
+    consulta lê apenas as poucas linhas de `monthly_summary` do usuário. Transferências
+    entre contas não são receitas nem despesas e ficam de fora.
+    """
+    keys = month_keys(today, DASHBOARD_MONTHS)
+
+    rows = db.execute(DASHBOARD_SQL, (keys[0], user_id, TRANSFER_GROUP)).fetchall()
+
+    total_income = total_expense = total_pending_income = total_pending_expense = 0
+    expenses_by_category = defaultdict(int)
+    monthly_flow = dict.fromkeys(keys, 0)
+
+    for row in rows:
+        total_income += row['income']
+        total_expense += row['expense']
+        total_pending_income += row['pending_income']
+        total_pending_expense += row['pending_expense']
+        if row['expense']:
+            expenses_by_category[row['category']] += row['expense']
+        if row['month'] in monthly_flow:
+            monthly_flow[row['month']] += row['income'] - row['expense']
+
+    return DashboardSummary(
+        total_income=Money(total_income),
+        total_expense=Money(total_expense),
+        total_pending_income=Money(total_pending_income),
+        total_pending_expense=Money(total_pending_expense),
+        balance=Money(total_income - total_expense),
+        expenses_by_category=[(category, Money(total)) for category, total in sorted(expenses_by_category.items())],
+        monthly_flow=[(month, Money(net)) for month, net in monthly_flow.items()]
+    )
+
+# --- Resumo Mensal ---
+SUMMARY_AGGREGATE_SQL = """
+    SELECT user_id, substr(COALESCE(date, due_date), 1, 7) AS month, type, status, category_id,
+           SUM(amount) AS total, COUNT(*) AS count
+    FROM all_transactions
+    {where}
+    GROUP BY user_id, month, type, status, category_id
+"""
+
+def rebuild_monthly_summary(db, user_id=None):
+    """Recalcula `monthly_summary` a partir dos lançamentos (de um usuário ou de todos), inclusive os arquivados."""
+    if user_id is None:
+        db.execute('DELETE FROM monthly_summary')
+        db.execute(
+            'INSERT INTO monthly_summary (user_id, month, type, status, category_id, total, count) '
+            + SUMMARY_AGGREGATE_SQL.format(where='')
+        )
+    else:
+        db.execute('DELETE FROM monthly_summary WHERE user_id = ?', (user_id,))
+        db.execute(
+            'INSERT INTO monthly_summary (user_id, month, type, status, category_id, total, count) '
+            + SUMMARY_AGGREGATE_SQL.format(where='WHERE user_id = ?'),
+            (user_id,)
+        )
+    db.commit()
+
+def verify_monthly_summary(db):
+    """Compara o resumo mensal com os lançamentos e devolve as chaves divergentes."""
+    key = lambda row: (row['user_id'], row['month'], row['type'], row['status'], row['category_id'])
+    expected = {key(row): (row['total'], row['count']) for row in db.execute(SUMMARY_AGGREGATE_SQL.format(where=''))}
+    stored = {key(row): (row['total'], row['count']) for row in db.execute('SELECT * FROM monthly_summary')}
+
+    mismatches = []
+    for summary_key in expected.keys() | stored.keys():
+        exp_total, exp_count = expected.get(summary_key, (0, 0))
+        got_total, got_count = stored.get(summary_key, (0, 0))
+        if (exp_total, exp_count) != (got_total, got_count):
+            mismatches.append((summary_key, (exp_total, exp_count), (got_total, got_count)))
+    return mismatches
+
+@app.cli.command('rebuild-summary')
+def rebuild_summary_command():
+    """Reconstrói as tabelas monthly_summary e account_balances a partir de transactions."""
+    rebuild_monthly_summary(get_db())
+    rebuild_account_balances(get_db())
+    print("Resumo mensal e saldos das contas reconstruídos.")
+
+@app.cli.command('verify-summary')
+def verify_summary_command():
+    """Verifica se monthly_summary e account_balances estão consistentes com transactions."""
+    mismatches = verify_monthly_summary(get_db()) + verify_account_balances(get_db())
+    for summary_key, expected, stored in mismatches:
+        print(f"Divergência em {summary_key}: esperado {expected}, armazenado {stored}")
+    if mismatches:
+        raise SystemExit(1)
+    print("Resumo mensal e saldos das contas consistentes.")
+
+# --- Hash de Senhas e Limite de Tentativas ---
+# O hash de senha (scrypt/pbkdf2) só gasta CPU: roda num pool de processos pequeno, para
+# que uma rajada de logins não ocupe os workers que servem o livro caixa. Além dos que
+# estão sendo calculados, só PASSWORD_HASH_QUEUE_LIMIT pedidos esperam; os demais são
+# recusados na hora. Os limites de tentativas valem por worker (memória do processo).
+PASSWORD_HASH_METHOD = os.environ.get('LIVRO_CAIXA_PASSWORD_HASH_METHOD', 'scrypt')  # ex.: 'scrypt:65536:8:1', 'pbkdf2:sha256:1000000'
+PASSWORD_HASH_WORKERS = int(os.environ.get('LIVRO_CAIXA_PASSWORD_HASH_WORKERS', '1'))
+PASSWORD_HASH_QUEUE_LIMIT = 8
+PASSWORD_HASH_TIMEOUT = 10  # segundos
+AUTH_IP_BUCKET = (20, 20 / 60)  # (capacidade, fichas por segundo): rajada de 20, depois 20 por minuto por IP
+LOGIN_USER_BUCKET = (5, 1 / 60)  # 5 tentativas, depois 1 por minuto por usuário
+RATE_LIMIT_MAX_KEYS = 10000
+
+class PasswordHashingBusy(RuntimeError):
+    pass
+
+class PasswordHasher:
+    """Pool de processos deste worker para o hash de senhas, com fila limitada."""
+
+    def __init__(self, workers, queue_limit):
+        self.pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        # forkserver: os processos não herdam as threads nem as conexões do worker, e só
+        # pré-carregam werkzeug.security (não o app, cuja importação roda as migrações; só
+        # com `python app.py` ele é reimportado como __main__, e init_db() nada faz de novo).
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['werkzeug.security'])
+        else:
+            context = multiprocessing.get_context('spawn')
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy("Servidor ocupado com outros logins; tente novamente em instantes.")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # A vaga só volta quando o hash termina (ou é cancelado), não quando a requisição
+        # desiste de esperar: um hash que estourou o tempo ainda ocupa o pool.
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordHashingBusy("Servidor ocupado com outros logins; tente novamente em instantes.")
+
+_password_hasher = None
+_password_hasher_lock = threading.Lock()
+_password_hash_prefix = None
+
+def get_password_hasher():
+    """Devolve o pool de hash deste processo, criando um novo após um fork (workers do gunicorn)."""
+    global _password_hasher
+    if _password_hasher is None or _password_hasher.pid != os.getpid():
+        with _password_hasher_lock:
+            if _password_hasher is None or _password_hasher.pid != os.getpid():
+                _password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+    return _password_hasher
+
+def hash_password(password):
+    """Hash de `password` com PASSWORD_HASH_METHOD, calculado no pool. Levanta PasswordHashingBusy."""
+    return get_password_hasher().run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    return get_password_hasher().run(check_password_hash, password_hash, password)
+
+def password_needs_rehash(password_hash):
+    """Se o hash gravado usa um método ou custo diferente de PASSWORD_HASH_METHOD.
+
+    O werkzeug grava o método com os parâmetros completos ('scrypt:32768:8:1$...'); o
+    prefixo esperado vem de um hash de referência, calculado uma vez por processo.
+    """
+    global _password_hash_prefix
+    if _password_hash_prefix is None:
+        _password_hash_prefix = hash_password('').split('$', 1)[0]
+    return password_hash.split('$', 1)[0] != _password_hash_prefix
+
+def rehash_password(db, user, password):
+    """Regrava o hash no custo configurado depois de um login válido; se o pool estiver ocupado, fica para o próximo."""
+    try:
+        if password_needs_rehash(user['password_hash']):
+            db.execute('UPDATE users SET password_hash = ? WHERE id = ?', (hash_password(password), user['id']))
+            db.commit()
+    except PasswordHashingBusy:
+        pass
+
+class RateLimiter:
+    """Baldes de fichas em memória por chave, seguros para threads, limitados a `maxsize` chaves (LRU).
+
+    Cada balde comporta `capacity` fichas e recebe `rate` fichas por segundo; cada tentativa
+    consome uma.
+    """
+
+    def __init__(self, capacity, rate, maxsize=RATE_LIMIT_MAX_KEYS):
+        self.capacity = capacity
+        self.rate = rate
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Consome uma ficha de `key`; devolve 0 se havia ficha ou os segundos até a próxima."""
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1 if tokens >= 1 else tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+auth_ip_limiter = RateLimiter(*AUTH_IP_BUCKET)
+login_user_limiter = RateLimiter(*LOGIN_USER_BUCKET)
+
+def too_many_attempts(wait, template, **context):
+    """Resposta 429 com Retry-After, renderizando de novo o formulário."""
+    seconds = math.ceil(wait)
+    flash(f"Muitas tentativas. Tente novamente em {seconds} segundo(s).", "danger")
+    response = app.make_response((render_template(template, **context), 429))
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
 # --- Rotas de Autenticação e Usuários ---
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -133,13 +1154,20 @@ def login():
         db = get_db()
         username = request.form['username']
         password = request.form['password']
+        wait = auth_ip_limiter.acquire(request.remote_addr) or login_user_limiter.acquire(username.strip().lower())
+        if wait:
+            return too_many_attempts(wait, 'login.html')
         user = db.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
 
-        if user and check_password_hash(user['password_hash'], password):
-            session.clear()
-            session['user_id'] = user['id']
-            session['username'] = user['username']
-            session['role'] = user['role']
+        try:
+            valid = user is not None and verify_password(user['password_hash'], password)
+        except PasswordHashingBusy as e:
+            flash(str(e), "warning")
+            return render_template('login.html'), 503
+        if valid:
+            login_user_limiter.reset(username.strip().lower())
+            rehash_password(db, user, password)
+            start_session(user)
             return redirect(url_for('index'))
         else:
             flash("Usuário ou senha inválidos.", "danger")
@@ -154,6 +1182,9 @@ def logout():
 @app.route('/forgot_password', methods=['GET', 'POST'])
 def forgot_password():
     if request.method == 'POST':
+        wait = auth_ip_limiter.acquire(request.remote_addr)
+        if wait:
+            return too_many_attempts(wait, 'forgot_password.html')
         db = get_db()
         email = request.form['email']
         user = db.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
@@ -178,6 +1209,9 @@ def reset_password(token):
         return redirect(url_for('login'))
 
     if request.method == 'POST':
+        wait = auth_ip_limiter.acquire(request.remote_addr)
+        if wait:
+            return too_many_attempts(wait, 'reset_password.html', token=token)
         new_password = request.form['password']
         confirm_password = request.form['confirm_password']
 
@@ -185,8 +1219,13 @@ def reset_password(token):
             flash("As senhas não coincidem.", "danger")
             return render_template('reset_password.html', token=token)
         
-        password_hash = generate_password_hash(new_password)
+        try:
+            password_hash = hash_password(new_password)
+        except PasswordHashingBusy as e:
+            flash(str(e), "warning")
+            return render_template('reset_password.html', token=token), 503
         db.execute('UPDATE users SET password_hash = ?, reset_token = NULL WHERE id = ?', (password_hash, user['id']))
+        revoke_sessions(db, user['id'])
         db.commit()
         flash("Sua senha foi redefinida com sucesso! Você já pode fazer login.", "success")
         return redirect(url_for('login'))
@@ -208,9 +1247,14 @@ def manage_users():
         elif db.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone() is not None:
             flash('Este e-mail já está em uso.', 'danger')
         else:
+            try:
+                password_hash = hash_password(password)
+            except PasswordHashingBusy as e:
+                flash(str(e), "warning")
+                return redirect(url_for('manage_users'))
             db.execute(
                 'INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)',
-                (username, email, generate_password_hash(password), role)
+                (username, email, password_hash, role)
             )
             db.commit()
             
@@ -236,6 +1280,7 @@ def manage_users():
 def delete_user(user_id):
     db = get_db()
     db.execute('DELETE FROM users WHERE id = ?', (user_id,))
+    revoke_sessions(db, user_id, bump_user=False)
     db.commit()
     flash('Usuário excluído com sucesso.', 'success')
     return redirect(url_for('manage_users'))
@@ -255,126 +1300,760 @@ def admin_reset_password(username):
         flash("Usuário não encontrado.", "danger")
     return redirect(url_for('manage_users'))
 
-# --- Rota de Backup ---
+# --- Backups ---
+BACKUP_DIR = os.environ.get('LIVRO_CAIXA_BACKUP_DIR') or os.path.join(os.path.dirname(os.path.abspath(DATABASE)), 'backups')
+BACKUP_RETENTION = 7  # snapshots mantidos; os mais antigos são apagados
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005  # pausa entre os passos da cópia, em segundos
+BACKUP_NAME = re.compile(r'^livro_caixa-\d{8}-\d{6}(-\d+)?\.db\.gz$')
+
+BackupFile = namedtuple('BackupFile', ['name', 'size', 'created', 'sha256'])
+
+def list_backups():
+    """Snapshots existentes, do mais recente para o mais antigo."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    backups = []
+    for name in os.listdir(BACKUP_DIR):
+        if not BACKUP_NAME.match(name):
+            continue
+        path = os.path.join(BACKUP_DIR, name)
+        checksum = None
+        if os.path.exists(path + '.sha256'):
+            with open(path + '.sha256', encoding='ascii') as f:
+                checksum = f.read().split(' ', 1)[0]
+        stat = os.stat(path)
+        backups.append(BackupFile(name, stat.st_size, datetime.fromtimestamp(stat.st_mtime), checksum))
+    return sorted(backups, key=lambda b: b.name, reverse=True)
+
+def rotate_backups():
+    for old in list_backups()[BACKUP_RETENTION:]:
+        for path in (os.path.join(BACKUP_DIR, old.name), os.path.join(BACKUP_DIR, old.name + '.sha256')):
+            if os.path.exists(path):
+                os.remove(path)
+
+def create_backup():
+    """Gera um snapshot consistente, comprimido e com sha256, e aplica a retenção.
+
+    A cópia usa a API de backup do SQLite em passos de BACKUP_PAGES_PER_STEP páginas, com
+    uma pausa entre eles; cada passo só lê o banco, então os escritores (WAL) não esperam.
+    O snapshot só recebe o nome final depois de comprimido e com a soma gravada.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    name = f"livro_caixa-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.db.gz"
+    path = os.path.join(BACKUP_DIR, name)
+    raw_path = os.path.join(BACKUP_DIR, f'.{name}.db.tmp')
+    gz_path = os.path.join(BACKUP_DIR, f'.{name}.tmp')
+    try:
+        source = connect_db()
+        target = sqlite3.connect(raw_path)
+        try:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=lambda *args: time.sleep(BACKUP_STEP_SLEEP))
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+            source.close()
+
+        digest = hashlib.sha256()
+        with open(raw_path, 'rb') as raw, open(gz_path, 'wb') as out:
+            with gzip.GzipFile(filename=name[:-3], mode='wb', fileobj=out) as compressed:
+                shutil.copyfileobj(raw, compressed)
+        with open(gz_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        with open(path + '.sha256', 'w', encoding='ascii') as f:
+            f.write(f"{digest.hexdigest()}  {name}\n")
+        os.replace(gz_path, path)
+    finally:
+        for tmp in (raw_path, gz_path):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    rotate_backups()
+    return name
+
+class BackupJob:
+    """Executa create_backup() numa thread de fundo, uma de cada vez por worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_name = None
+        self.last_error = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return False
+            self._thread = threading.Thread(target=self._run, name='livro-caixa-backup', daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self):
+        try:
+            self.last_name, self.last_error = create_backup(), None
+        except Exception as e:
+            self.last_error = str(e)
+            app.logger.exception("Falha ao gerar o backup")
+
+backup_job = BackupJob()
+
 @app.route('/backup_db')
 @admin_required
 def backup_db():
-    """Envia o ficheiro da base de dados como um anexo para download."""
+    """Inicia um snapshot em segundo plano e leva à lista de backups."""
+    if backup_job.start():
+        flash("Backup iniciado. Ele aparecerá na lista assim que terminar.", "info")
+    else:
+        flash("Já existe um backup em andamento.", "warning")
+    return redirect(url_for('backups'))
+
+@app.route('/admin/backups')
+@admin_required
+def backups():
+    return render_template(
+        'backups.html',
+        backups=list_backups(),
+        running=backup_job.running,
+        last_error=backup_job.last_error,
+        retention=BACKUP_RETENTION
+    )
+
+@app.route('/admin/backups/<name>')
+@admin_required
+def download_backup(name):
+    """Envia um snapshot pronto (lido do disco em blocos), com a soma sha256 no cabeçalho."""
+    backup = next((b for b in list_backups() if b.name == name), None)
+    if backup is None:
+        abort(404)
+    response = send_file(os.path.join(BACKUP_DIR, backup.name), as_attachment=True, mimetype='application/gzip')
+    if backup.sha256:
+        response.headers['X-Checksum-SHA256'] = backup.sha256
+    return response
+
+@app.cli.command('backup')
+def backup_command():
+    """Gera um snapshot do banco em BACKUP_DIR, aplicando a retenção."""
+    name = create_backup()
+    print(f"Backup gravado: {os.path.join(BACKUP_DIR, name)}")
+
+@app.route('/admin/pool_stats')
+@admin_required
+def pool_stats():
+    """Estatísticas do pool de conexões deste worker."""
+    return jsonify(get_pool().stats())
+
+@app.route('/admin/report_cache_stats')
+@admin_required
+def report_cache_stats():
+    """Estatísticas do cache de relatórios deste worker."""
+    return jsonify(report_cache.stats())
+
+def metrics_exposition():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.exposition())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Histogramas por endpoint deste worker, no formato texto do Prometheus.
+
+    Com LIVRO_CAIXA_METRICS_TOKEN definido, exige `Authorization: Bearer <token>` (para o
+    coletor); sem ele, só um administrador logado pode ver.
+    """
+    if not INSTRUMENTATION_ENABLED:
+        abort(404)
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+            abort(401)
+        return metrics_exposition()
+    return admin_required(metrics_exposition)()
+
+# --- Lançamentos Recorrentes ---
+RECURRING_FREQUENCIES = {
+    'diaria': ('days', 1),
+    'semanal': ('days', 7),
+    'mensal': ('months', 1),
+    'anual': ('months', 12),
+}
+RECURRING_FREQUENCY_LABELS = {'diaria': 'Diária', 'semanal': 'Semanal', 'mensal': 'Mensal', 'anual': 'Anual'}
+RECURRING_BATCH_SIZE = 500
+# Regras do usuário com vencimentos ainda não gerados até a data pedida.
+RECURRING_PENDING_WHERE = (
+    "WHERE user_id = ? AND materialized_until < ? AND (end_date IS NULL OR materialized_until < end_date)"
+)
+
+def add_months(day, months):
+    """Soma `months` meses a uma data, limitando o dia ao último do mês (31/01 + 1 = 28/02)."""
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    month += 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+def month_end(day):
+    """Último dia do mês de `day`."""
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+def rule_occurrences(start, frequency, interval, first, last):
+    """Vencimentos de uma regra entre `first` e `last` (inclusive), como datas.
+
+    Cada vencimento é calculado a partir de `start` (e não do anterior), então uma regra
+    mensal do dia 31 volta ao dia 31 depois de fevereiro.
+    """
+    unit, size = RECURRING_FREQUENCIES[frequency]
+    step = size * interval
+    if unit == 'days':
+        n = max(0, -(-(first - start).days // step))
+        occurrence = lambda n: start + timedelta(days=n * step)
+    else:
+        n = max(0, ((first.year - start.year) * 12 + first.month - start.month) // step - 1)
+        occurrence = lambda n: add_months(start, n * step)
+    while True:
+        day = occurrence(n)
+        if day > last:
+            return
+        if day >= first:
+            yield day
+        n += 1
+
+
+def materialize_recurring(db, user_id, until):
+    """Gera os lançamentos das regras recorrentes do usuário até `until` ('AAAA-MM-DD').
+
+    Sem regras atrasadas custa uma consulta pelo índice. Havendo, gera os vencimentos entre
+    `materialized_until` e `until` como lançamentos pendentes, em lotes de `executemany`,
+    numa transação `BEGIN IMMEDIATE` (as regras são relidas já com o bloqueio, para que duas
+    requisições não gerem a mesma janela). Devolve o número de lançamentos incluídos.
+    """
+    if db.execute('SELECT 1 FROM recurring_rules ' + RECURRING_PENDING_WHERE + ' LIMIT 1', (user_id, until)).fetchone() is None:
+        return 0
+    db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    inserted = 0
     try:
-        return send_file(DATABASE, as_attachment=True)
-    except Exception as e:
-        flash(f"Erro ao gerar o backup: {e}", "danger")
-        return redirect(url_for('index'))
+        rules = db.execute('SELECT * FROM recurring_rules ' + RECURRING_PENDING_WHERE, (user_id, until)).fetchall()
+        for rule in rules:
+            last = min(until, rule['end_date'] or until)
+            occurrences = rule_occurrences(
+                parse_date(rule['start_date']).date(), rule['frequency'], rule['interval'],
+                parse_date(rule['materialized_until']).date() + timedelta(days=1), parse_date(last).date()
+            )
+            rows = (
+                (user_id, rule['description'], rule['amount'], rule['type'], rule['category_id'],
+                 day.isoformat(), rule['client_id'], rule['supplier_id'], rule['id'])
+                for day in occurrences
+            )
+            while True:
+                batch = list(itertools.islice(rows, RECURRING_BATCH_SIZE))
+                if not batch:
+                    break
+                inserted += db.executemany(
+                    "INSERT OR IGNORE INTO transactions (user_id, description, amount, type, category_id, date, due_date, status, client_id, supplier_id, recurring_rule_id) "
+                    "VALUES (?, ?, ?, ?, ?, NULL, ?, 'pendente', ?, ?, ?)", batch
+                ).rowcount
+            db.execute('UPDATE recurring_rules SET materialized_until = ? WHERE id = ?', (last, rule['id']))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return inserted
+
+def materializes_recurring(until):
+    """Gera os lançamentos recorrentes do usuário até `until()` antes de executar a rota.
+
+    Deve vir antes de `cached_report`, para que o ETag já reflita os lançamentos gerados.
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            end = until()
+            if parse_date(end):
+                materialize_recurring(get_db(), session['user_id'], end)
+            return view(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def current_month_end():
+    """Janela padrão da geração: até o fim do mês corrente."""
+    return month_end(datetime.today()).strftime('%Y-%m-%d')
 
 # --- Rotas da Aplicação Financeira ---
 @app.route('/')
 @login_required
+@materializes_recurring(current_month_end)
+@cached_report(lambda: (datetime.today().strftime('%Y-%m-%d'),))
 def index():
     db = get_db()
     user_id = session['user_id']
 
-    total_income = db.execute(
-        "SELECT SUM(amount) FROM transactions WHERE user_id = ? AND type = 'receita' AND status IN ('pago', 'recebido')", (user_id,)
-    ).fetchone()[0] or 0.0
+    summary = compute_dashboard(db, user_id, datetime.today())
 
-    total_expense = db.execute(
-        "SELECT SUM(amount) FROM transactions WHERE user_id = ? AND type = 'despesa' AND status = 'pago'", (user_id,)
-    ).fetchone()[0] or 0.0
-    
-    total_pending_income = db.execute(
-        "SELECT SUM(amount) FROM transactions WHERE user_id = ? AND type = 'receita' AND status = 'pendente'", (user_id,)
-    ).fetchone()[0] or 0.0
-    
-    total_pending_expense = db.execute(
-        "SELECT SUM(amount) FROM transactions WHERE user_id = ? AND type = 'despesa' AND status = 'pendente'", (user_id,)
-    ).fetchone()[0] or 0.0
-
-    balance = total_income - total_expense
-
-    expenses_by_category = db.execute(
-        "SELECT category, SUM(amount) as total FROM transactions WHERE user_id = ? AND type = 'despesa' AND status = 'pago' GROUP BY category",
-        (user_id,)
-    ).fetchall()
-    
     pie_chart_data = {
-        "labels": [row['category'] for row in expenses_by_category],
-        "data": [row['total'] for row in expenses_by_category]
+        "labels": [category for category, _ in summary.expenses_by_category],
+        "data": [float(total) for _, total in summary.expenses_by_category]
     }
 
-    monthly_flow = {}
-    today = datetime.today()
-    for i in range(6):
-        month = today - timedelta(days=30 * i)
-        month_key = month.strftime("%Y-%m")
-        monthly_flow[month_key] = {"income": 0, "expense": 0}
-
-    all_paid_transactions = db.execute(
-        "SELECT amount, type, date FROM transactions WHERE user_id = ? AND status IN ('pago', 'recebido') AND date IS NOT NULL",
-        (user_id,)
-    ).fetchall()
-
-    for tx in all_paid_transactions:
-        tx_date = datetime.strptime(tx['date'], '%Y-%m-%d')
-        month_key = tx_date.strftime("%Y-%m")
-        if month_key in monthly_flow:
-            if tx['type'] == 'receita':
-                monthly_flow[month_key]['income'] += tx['amount']
-            else:
-                monthly_flow[month_key]['expense'] += tx['amount']
-    
-    line_chart_labels = sorted(monthly_flow.keys())
-    line_chart_data = [monthly_flow[key]['income'] - monthly_flow[key]['expense'] for key in line_chart_labels]
-    line_chart_labels_formatted = [datetime.strptime(key, "%Y-%m").strftime("%b/%y") for key in line_chart_labels]
-
     line_chart_data_final = {
-        "labels": line_chart_labels_formatted,
-        "data": line_chart_data
+        "labels": [datetime.strptime(key, "%Y-%m").strftime("%b/%y") for key, _ in summary.monthly_flow],
+        "data": [float(net) for _, net in summary.monthly_flow]
     }
 
     return render_template(
         'index.html', 
-        balance=balance,
-        total_income=total_income,
-        total_expense=total_expense,
-        total_pending_income=total_pending_income,
-        total_pending_expense=total_pending_expense,
+        balance=summary.balance,
+        total_income=summary.total_income,
+        total_expense=summary.total_expense,
+        total_pending_income=summary.total_pending_income,
+        total_pending_expense=summary.total_pending_expense,
         pie_chart_data=pie_chart_data,
-        line_chart_data=line_chart_data_final
+        line_chart_data=line_chart_data_final,
+        account_balances=fetch_account_balances(db, user_id)
     )
 
+# --- Projeção de Fluxo de Caixa ---
+FORECAST_DAYS = 90
+FORECAST_MAX_DAYS = 365
+FORECAST_GRANULARITIES = ('diaria', 'semanal')
+FORECAST_PATTERN_MONTHS = 6  # meses completos de histórico examinados
+FORECAST_PATTERN_MIN_MONTHS = 4  # meses em que a descrição precisa aparecer para virar padrão
+
+ForecastPattern = namedtuple('ForecastPattern', ['description', 'type', 'amount', 'day'])
+CashFlowForecast = namedtuple('CashFlowForecast', ['start', 'start_balance', 'income', 'expense', 'balance', 'patterns'])
+
+def forecast_days(args):
+    """Horizonte pedido em dias (`days`), limitado a 1..FORECAST_MAX_DAYS."""
+    try:
+        days = int(args.get('days', FORECAST_DAYS))
+    except ValueError:
+        days = FORECAST_DAYS
+    return max(1, min(days, FORECAST_MAX_DAYS))
+
+def forecast_horizon():
+    """Último dia da projeção pedida, usado para gerar os lançamentos recorrentes antes dela."""
+    return (datetime.today() + timedelta(days=forecast_days(request.args))).strftime('%Y-%m-%d')
+
+def inferred_patterns(db, user_id, today):
+    """Lançamentos mensais inferidos do histórico, para projetar contas que não têm regra.
+
+    Uma descrição (sem diferença de maiúsculas) conta como mensal se aparece exatamente uma
+    vez por mês em pelo menos FORECAST_PATTERN_MIN_MONTHS dos últimos FORECAST_PATTERN_MONTHS
+    meses completos, inclusive no último. Valor e dia do vencimento são as médias do período.
+    Lançamentos gerados por regras recorrentes ficam de fora, pois a própria regra já os projeta.
+    """
+    month_start = today.replace(day=1)
+    window_start = add_months(month_start, -FORECAST_PATTERN_MONTHS)
+    sql = """
+        SELECT MAX(description) AS description, type,
+               CAST(ROUND(AVG(amount)) AS INTEGER) AS amount,
+               CAST(ROUND(AVG(CAST(substr(due_date, 9, 2) AS INTEGER))) AS INTEGER) AS day
+        FROM transactions
+        WHERE user_id = ? AND due_date >= ? AND due_date < ? AND recurring_rule_id IS NULL AND transfer_id IS NULL
+        GROUP BY lower(trim(description)), type
+        HAVING COUNT(*) = COUNT(DISTINCT substr(due_date, 1, 7)) AND COUNT(*) >= ? AND MAX(due_date) >= ?
+    """
+    rows = db.execute(
+        period_sql(db, user_id, sql, window_start.strftime('%Y-%m-%d')),
+        (user_id, window_start.strftime('%Y-%m-%d'), month_start.strftime('%Y-%m-%d'),
+         FORECAST_PATTERN_MIN_MONTHS, add_months(month_start, -1).strftime('%Y-%m-%d'))
+    ).fetchall()
+    return [ForecastPattern(row['description'], row['type'], row['amount'], row['day']) for row in rows]
+
+def project_cash_flow(db, user_id, today, days):
+    """Projeta o saldo dia a dia de hoje até `days` dias à frente.
+
+    Parte do saldo atual (o mesmo do dashboard) e soma os lançamentos pendentes na data de
+    vencimento (os vencidos contam hoje) e os padrões mensais inferidos do histórico que
+    ainda não foram lançados no mês. Entradas e saídas são acumuladas em vetores NumPy
+    indexados pelo dia, e o saldo é a soma cumulativa deles.
+    """
+    start = np.datetime64(today.strftime('%Y-%m-%d'), 'D')
+    horizon = (today + timedelta(days=days)).strftime('%Y-%m-%d')
+    start_balance = db.execute(
+        "SELECT COALESCE(SUM(CASE WHEN type = 'receita' THEN total ELSE -total END), 0) FROM monthly_summary "
+        "WHERE user_id = ? AND status IN ('pago', 'recebido')", (user_id,)
+    ).fetchone()[0]
+
+    pending = db.execute(
+        "SELECT due_date, type, SUM(amount) AS total FROM transactions "
+        "WHERE user_id = ? AND status = 'pendente' AND due_date <= ? GROUP BY due_date, type",
+        (user_id, horizon)
+    ).fetchall()
+    due_dates = [row['due_date'] for row in pending]
+    is_income = [row['type'] == 'receita' for row in pending]
+    totals = [row['total'] for row in pending]
+
+    # Padrões inferidos: um vencimento por mês, a partir de amanhã, nos meses em que a
+    # descrição ainda não foi lançada.
+    patterns = inferred_patterns(db, user_id, today)
+    if patterns:
+        entered = set(db.execute(
+            "SELECT DISTINCT lower(trim(description)), substr(due_date, 1, 7) FROM transactions "
+            "WHERE user_id = ? AND due_date >= ? AND due_date <= ?",
+            (user_id, today.replace(day=1).strftime('%Y-%m-%d'), horizon)
+        ).fetchall())
+        last_day = today + timedelta(days=days)
+        for pattern in patterns:
+            key = pattern.description.strip().lower()
+            month = today.replace(day=1)
+            while month <= last_day:
+                due = month.replace(day=min(pattern.day, calendar.monthrange(month.year, month.month)[1]))
+                if today < due <= last_day and (key, due.strftime('%Y-%m')) not in entered:
+                    due_dates.append(due.strftime('%Y-%m-%d'))
+                    is_income.append(pattern.type == 'receita')
+                    totals.append(pattern.amount)
+                month = add_months(month, 1)
+
+    offsets = np.clip((np.array(due_dates, dtype='datetime64[D]') - start).astype(np.int64), 0, days)
+    amounts = np.array(totals, dtype=np.int64)
+    is_income = np.array(is_income, dtype=bool)
+    income = np.zeros(days + 1, dtype=np.int64)
+    expense = np.zeros(days + 1, dtype=np.int64)
+    np.add.at(income, offsets[is_income], amounts[is_income])
+    np.add.at(expense, offsets[~is_income], amounts[~is_income])
+    balance = start_balance + np.cumsum(income - expense)
+    return CashFlowForecast(start, start_balance, income, expense, balance, patterns)
+
+def forecast_series(forecast, granularity):
+    """Agrupa a projeção diária em semanas, se pedido: entradas e saídas somadas, saldo no fim da semana."""
+    dates = forecast.start + np.arange(len(forecast.balance))
+    if granularity != 'semanal':
+        return dates, forecast.income, forecast.expense, forecast.balance
+    starts = np.arange(0, len(forecast.balance), 7)
+    ends = np.minimum(starts + 6, len(forecast.balance) - 1)
+    return (dates[starts], np.add.reduceat(forecast.income, starts),
+            np.add.reduceat(forecast.expense, starts), forecast.balance[ends])
+
+def cents_to_list(values):
+    """Vetor de centavos como lista de reais, para o JSON dos gráficos."""
+    return (values / 100).round(2).tolist()
+
+@app.route('/dashboard/projecao')
+@login_required
+@materializes_recurring(forecast_horizon)
+def cash_flow_forecast():
+    """Projeção do saldo em JSON (`days`, `granularity` = diaria|semanal), usada pelo gráfico do dashboard."""
+    days = forecast_days(request.args)
+    granularity = request.args.get('granularity', 'diaria')
+    if granularity not in FORECAST_GRANULARITIES:
+        granularity = 'diaria'
+    forecast = project_cash_flow(get_db(), session['user_id'], datetime.today().date(), days)
+    dates, income, expense, balance = forecast_series(forecast, granularity)
+    lowest = int(np.argmin(forecast.balance))
+    return jsonify(
+        days=days,
+        granularity=granularity,
+        start_balance=forecast.start_balance / 100,
+        labels=[str(day) for day in dates],
+        income=cents_to_list(income),
+        expense=cents_to_list(expense),
+        balance=cents_to_list(balance),
+        min_balance=int(forecast.balance[lowest]) / 100,
+        min_balance_date=str(forecast.start + lowest),
+        patterns=[pattern._asdict() | {'amount': pattern.amount / 100} for pattern in forecast.patterns]
+    )
+
+# --- Leitura de Lançamentos ---
+# Colunas de um lançamento com os nomes de categoria, cliente/fornecedor e conta/cartão resolvidos.
+# `counterparty` e `account_ref` são os valores usados nos selects dos formulários
+# ('cliente:ID'/'fornecedor:ID' e 'conta:ID'/'cartao:ID').
+TRANSACTION_SELECT = """
+    SELECT t.id, t.description, t.amount, t.type, t.category_id, c.name AS category,
+           t.date, t.due_date, t.status, t.client_id, t.supplier_id,
+           COALESCE(cl.name, su.name) AS client_supplier,
+           CASE WHEN t.client_id IS NOT NULL THEN 'cliente:' || t.client_id
+                WHEN t.supplier_id IS NOT NULL THEN 'fornecedor:' || t.supplier_id END AS counterparty,
+           t.payment_method_id, t.transfer_id, COALESCE(ac.name, cc.name) AS account,
+           CASE WHEN t.account_id IS NOT NULL THEN 'conta:' || t.account_id
+                WHEN t.credit_card_id IS NOT NULL THEN 'cartao:' || t.credit_card_id END AS account_ref
+    FROM transactions t
+    JOIN categories c ON c.id = t.category_id
+    LEFT JOIN clients cl ON cl.id = t.client_id
+    LEFT JOIN suppliers su ON su.id = t.supplier_id
+    LEFT JOIN accounts ac ON ac.id = t.account_id
+    LEFT JOIN credit_cards cc ON cc.id = t.credit_card_id
+"""
+
+def transaction_references(db, user_id, form):
+    """Valida e devolve (category_id, client_id, supplier_id) do formulário de lançamento.
+
+    Levanta ValueError se a categoria ou o cliente/fornecedor não pertencerem ao usuário.
+    """
+    category = db.execute(
+        'SELECT id FROM categories WHERE id = ? AND user_id = ?', (form.get('category_id'), user_id)
+    ).fetchone()
+    if category is None:
+        raise ValueError("Categoria inválida.")
+    return (category['id'], *counterparty_reference(db, user_id, form.get('counterparty')))
+
+def counterparty_reference(db, user_id, value):
+    """Converte 'cliente:ID' ou 'fornecedor:ID' do usuário em (client_id, supplier_id).
+
+    Um valor vazio vale (None, None); levanta ValueError se o cadastro não for do usuário.
+    """
+    kind, _, ref_id = (value or '').partition(':')
+    if kind not in ('cliente', 'fornecedor'):
+        return None, None
+    table = 'clients' if kind == 'cliente' else 'suppliers'
+    ref = db.execute(f'SELECT id FROM {table} WHERE id = ? AND user_id = ?', (ref_id, user_id)).fetchone()
+    if ref is None:
+        raise ValueError("Cliente/Fornecedor inválido.")
+    return (ref['id'], None) if kind == 'cliente' else (None, ref['id'])
+
+def transaction_form_options(db, user_id):
+    """Categorias agrupadas, clientes e fornecedores para os selects dos formulários."""
+    categories_grouped = defaultdict(list)
+    for cat in db.execute('SELECT id, name, category_group FROM categories WHERE user_id = ? ORDER BY category_group, name', (user_id,)):
+        categories_grouped[cat['category_group']].append((cat['id'], cat['name']))
+    clients = db.execute('SELECT id, name FROM clients WHERE user_id = ? ORDER BY name', (user_id,)).fetchall()
+    suppliers = db.execute('SELECT id, name FROM suppliers WHERE user_id = ? ORDER BY name', (user_id,)).fetchall()
+    return categories_grouped, clients, suppliers
+
+def account_reference(db, user_id, value):
+    """Converte 'conta:ID' ou 'cartao:ID' do usuário em (account_id, credit_card_id).
+
+    Um valor vazio vale (None, None); levanta ValueError se a conta/cartão não for do usuário.
+    """
+    kind, _, ref_id = (value or '').partition(':')
+    if kind not in ('conta', 'cartao'):
+        return None, None
+    table = 'accounts' if kind == 'conta' else 'credit_cards'
+    ref = db.execute(f'SELECT id FROM {table} WHERE id = ? AND user_id = ?', (ref_id, user_id)).fetchone()
+    if ref is None:
+        raise ValueError("Conta/Cartão inválido.")
+    return (ref['id'], None) if kind == 'conta' else (None, ref['id'])
+
+def payment_references(db, user_id, form):
+    """Valida e devolve (account_id, credit_card_id, payment_method_id) do formulário de lançamento."""
+    account_id, credit_card_id = account_reference(db, user_id, form.get('account'))
+    payment_method_id = None
+    if form.get('payment_method_id'):
+        method = db.execute(
+            'SELECT id FROM payment_methods WHERE id = ? AND user_id = ?', (form['payment_method_id'], user_id)
+        ).fetchone()
+        if method is None:
+            raise ValueError("Forma de pagamento inválida.")
+        payment_method_id = method['id']
+    return account_id, credit_card_id, payment_method_id
+
+def payment_form_options(db, user_id):
+    """Contas, cartões e formas de pagamento do usuário numa só consulta, por tipo ('conta', 'cartao', 'forma')."""
+    options = {'conta': [], 'cartao': [], 'forma': []}
+    for row in db.execute(
+        "SELECT 'conta' AS kind, id, name FROM accounts WHERE user_id = ? "
+        "UNION ALL SELECT 'cartao', id, name FROM credit_cards WHERE user_id = ? "
+        "UNION ALL SELECT 'forma', id, name FROM payment_methods WHERE user_id = ? "
+        "ORDER BY kind, name",
+        (user_id, user_id, user_id)
+    ):
+        options[row['kind']].append(row)
+    return options
+
+# --- Paginação de Lançamentos ---
+LANCAMENTOS_PAGE_SIZE = 50
+LANCAMENTOS_MAX_PAGE_SIZE = 200
+LEDGER_FILTER_ARGS = ('filter_date', 'filter_type', 'filter_status')
+
+def ledger_filters(args):
+    """Traduz os filtros do formulário de lançamentos em condições SQL."""
+    conditions, params = [], []
+    if args.get('filter_date'):
+        conditions.append('t.due_date = ?')
+        params.append(args['filter_date'])
+    if args.get('filter_type') in ('receita', 'despesa'):
+        conditions.append('t.type = ?')
+        params.append(args['filter_type'])
+    if args.get('filter_status') == 'pago':
+        conditions.append("t.status IN ('pago', 'recebido')")
+    elif args.get('filter_status') == 'pendente':
+        conditions.append("t.status = 'pendente'")
+    return conditions, params
+
+def decode_cursor(cursor):
+    """Converte o cursor 'AAAA-MM-DD:id' em (due_date, id); devolve None se for inválido."""
+    due_date, _, tx_id = (cursor or '').rpartition(':')
+    if not parse_date(due_date) or not tx_id.isdigit():
+        return None
+    return due_date, int(tx_id)
+
+def page_size_from(args):
+    try:
+        page_size = int(args.get('per_page', LANCAMENTOS_PAGE_SIZE))
+    except ValueError:
+        page_size = LANCAMENTOS_PAGE_SIZE
+    return max(1, min(page_size, LANCAMENTOS_MAX_PAGE_SIZE))
+
+def ledger_page_query(select, user_id, args, page_size):
+    """SQL e parâmetros de uma página por keyset em (due_date, id), com os filtros da listagem.
+
+    `select` dá as colunas (TRANSACTION_SELECT na listagem, API_TRANSACTION_SELECT na API);
+    pede uma linha a mais que `page_size` para saber se há próxima página.
+    """
+    conditions, params = ledger_filters(args)
+    cursor = decode_cursor(args.get('cursor'))
+    if cursor:
+        conditions.append('(t.due_date, t.id) < (?, ?)')
+        params.extend(cursor)
+    where = ''.join(' AND ' + condition for condition in conditions)
+    return (
+        select + 'WHERE t.user_id = ?' + where + ' ORDER BY t.due_date DESC, t.id DESC LIMIT ?',
+        (user_id, *params, page_size + 1)
+    )
+
+def fetch_ledger_page(db, user_id, args):
+    """Busca uma página de lançamentos por keyset em (due_date, id), do mais recente ao mais antigo.
+
+    Devolve (linhas, próximo cursor ou None). O custo depende do tamanho da página, não do
+    tamanho do livro: a consulta percorre o índice (user_id, due_date) a partir do cursor.
+    """
+    page_size = page_size_from(args)
+    rows = db.execute(*ledger_page_query(TRANSACTION_SELECT, user_id, args, page_size)).fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = f"{rows[-1]['due_date']}:{rows[-1]['id']}"
+    return rows, next_cursor
+
+def next_page_args(args, next_cursor):
+    """Parâmetros da próxima página, preservando filtros e tamanho de página."""
+    if next_cursor is None:
+        return None
+    page_args = {key: args[key] for key in LEDGER_FILTER_ARGS + ('per_page',) if args.get(key)}
+    page_args['cursor'] = next_cursor
+    return page_args
+
 @app.route('/lancamentos')
 @login_required
+@materializes_recurring(current_month_end)
 def lancamentos():
+    if request.args.get('q', '').strip():
+        return redirect(url_for('search_transactions', **request.args))
     db = get_db()
     user_id = session['user_id']
     
-    transactions_from_db = db.execute(
-        'SELECT * FROM transactions WHERE user_id = ? ORDER BY due_date DESC', (user_id,)
-    ).fetchall()
+    transactions, next_cursor = fetch_ledger_page(db, user_id, request.args)
 
-    transactions = []
-    for tx_row in transactions_from_db:
-        tx_dict = dict(tx_row)
-        tx_dict['date'] = parse_date(tx_dict['date'])
-        tx_dict['due_date'] = parse_date(tx_dict['due_date'])
-        transactions.append(tx_dict)
+    categories_grouped, clients, suppliers = transaction_form_options(db, user_id)
 
-    categories_from_db = db.execute('SELECT name, category_group FROM categories WHERE user_id = ? ORDER BY category_group, name', (user_id,)).fetchall()
-    
-    categories_grouped = defaultdict(list)
-    for cat in categories_from_db:
-        categories_grouped[cat['category_group']].append(cat['name'])
+    return render_template(
+        'lancamentos.html',
+        transactions=transactions,
+        next_page_args=next_page_args(request.args, next_cursor),
+        today_date=datetime.now().strftime('%Y-%m-%d'),
+        categories_grouped=categories_grouped,
+        clients=clients,
+        suppliers=suppliers,
+        payment_options=payment_form_options(db, user_id)
+    )
 
-    clients = db.execute('SELECT name FROM clients WHERE user_id = ? ORDER BY name', (user_id,)).fetchall()
-    suppliers = db.execute('SELECT name FROM suppliers WHERE user_id = ? ORDER BY name', (user_id,)).fetchall()
+@app.route('/lancamentos/pagina')
+@login_required
+def lancamentos_page():
+    """Próxima página de lançamentos em JSON, usada pela rolagem infinita."""
+    transactions, next_cursor = fetch_ledger_page(get_db(), session['user_id'], request.args)
+    page_args = next_page_args(request.args, next_cursor)
+    return jsonify(
+        html=render_template('_lancamento_rows.html', transactions=transactions),
+        count=len(transactions),
+        next_cursor=next_cursor,
+        next_url=url_for('lancamentos_page', **page_args) if page_args else None
+    )
+
+# --- Busca de Lançamentos (FTS5) ---
+SEARCH_ARGS = ('q', 'start_date', 'end_date') + LEDGER_FILTER_ARGS
+SEARCH_TERM = re.compile(r'"([^"]*)"|(\w+)')
+
+def fts_query(text):
+    """Converte o texto digitado numa consulta FTS5, sem expor a sintaxe do FTS5 ao usuário.
+
+    Trechos entre aspas viram frases exatas e as demais palavras buscam por prefixo
+    ('alug' encontra 'aluguel'); todos os termos precisam aparecer.
+    """
+    terms = []
+    for phrase, word in SEARCH_TERM.findall(text or ''):
+        if word:
+            terms.append(f'"{word}"*')
+        elif re.findall(r'\w+', phrase):
+            terms.append('"' + ' '.join(re.findall(r'\w+', phrase)) + '"')
+    return ' '.join(terms)
+
+def search_page_query(user_id, args, query, page, page_size):
+    """SQL e parâmetros da página `page` da busca `query` (já no formato do FTS5)."""
+    conditions, params = ledger_filters(args)
+    if parse_date(args.get('start_date')):
+        conditions.append('t.due_date >= ?')
+        params.append(args['start_date'])
+    if parse_date(args.get('end_date')):
+        conditions.append('t.due_date <= ?')
+        params.append(args['end_date'])
+    where = ''.join(' AND ' + condition for condition in conditions)
+    return (
+        TRANSACTION_SELECT + 'JOIN transactions_fts ON transactions_fts.rowid = t.id '
+        'WHERE transactions_fts MATCH ? AND t.user_id = ?' + where +
+        ' ORDER BY transactions_fts.rank, t.id LIMIT ? OFFSET ?',
+        (query, user_id, *params, page_size + 1, (page - 1) * page_size)
+    )
+
+def fetch_search_page(db, user_id, args):
+    """Uma página de resultados da busca, do mais ao menos relevante (bm25).
+
+    Combina o MATCH no índice transactions_fts com os filtros da listagem e um período
+    opcional de vencimento. Devolve (linhas, número da próxima página ou None).
+    """
+    query = fts_query(args.get('q'))
+    if not query:
+        return [], None
+    page = int(args['page']) if str(args.get('page', '')).isdigit() and int(args['page']) > 0 else 1
+    page_size = page_size_from(args)
+    rows = db.execute(*search_page_query(user_id, args, query, page, page_size)).fetchall()
+    if len(rows) > page_size:
+        return rows[:page_size], page + 1
+    return rows, None
+
+def search_page_args(args, next_page):
+    if next_page is None:
+        return None
+    page_args = {key: args[key] for key in SEARCH_ARGS + ('per_page',) if args.get(key)}
+    page_args['page'] = next_page
+    return page_args
+
+@app.route('/lancamentos/busca')
+@login_required
+@materializes_recurring(current_month_end)
+def search_transactions():
+    """Busca textual nos lançamentos (descrição, categoria e cliente/fornecedor)."""
+    db = get_db()
+    user_id = session['user_id']
+    transactions, next_page = fetch_search_page(db, user_id, request.args)
+    categories_grouped, clients, suppliers = transaction_form_options(db, user_id)
 
     return render_template(
         'lancamentos.html',
         transactions=transactions,
+        next_page_args=search_page_args(request.args, next_page),
+        page_endpoint='search_transactions',
+        page_json_endpoint='search_transactions_page',
         today_date=datetime.now().strftime('%Y-%m-%d'),
         categories_grouped=categories_grouped,
         clients=clients,
-        suppliers=suppliers
+        suppliers=suppliers,
+        payment_options=payment_form_options(db, user_id)
+    )
+
+@app.route('/lancamentos/busca/pagina')
+@login_required
+def search_transactions_page():
+    """Próxima página de resultados da busca em JSON, para a rolagem infinita."""
+    transactions, next_page = fetch_search_page(get_db(), session['user_id'], request.args)
+    page_args = search_page_args(request.args, next_page)
+    return jsonify(
+        html=render_template('_lancamento_rows.html', transactions=transactions),
+        count=len(transactions),
+        next_page=next_page,
+        next_url=url_for('search_transactions_page', **page_args) if page_args else None
     )
 
 @app.route('/add', methods=['POST'])
@@ -383,6 +2062,18 @@ def add_transaction():
     db = get_db()
     user_id = session['user_id']
     
+    try:
+        amount = Money.parse(request.form['amount'])
+    except ValueError:
+        flash("Valor inválido.", "danger")
+        return redirect(url_for('lancamentos'))
+    try:
+        category_id, client_id, supplier_id = transaction_references(db, user_id, request.form)
+        account_id, credit_card_id, payment_method_id = payment_references(db, user_id, request.form)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for('lancamentos'))
+
     is_paid = 'is_paid' in request.form
     payment_date = request.form.get('date')
     transaction_type = request.form['type']
@@ -393,33 +2084,86 @@ def add_transaction():
     else:
         status = 'pendente'
         payment_date = None
+    try:
+        check_open_period(db, user_id, payment_date or request.form['due_date'])
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for('lancamentos'))
 
     db.execute(
-        'INSERT INTO transactions (user_id, description, amount, type, category, date, due_date, status, client_supplier) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-        (user_id, request.form['description'], float(request.form['amount']), transaction_type, request.form['category'], payment_date, request.form['due_date'], status, request.form.get('client_supplier'))
+        'INSERT INTO transactions (user_id, description, amount, type, category_id, date, due_date, status, client_id, supplier_id, '
+        'account_id, credit_card_id, payment_method_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (user_id, request.form['description'], amount.cents, transaction_type, category_id, payment_date, request.form['due_date'], status,
+         client_id, supplier_id, account_id, credit_card_id, payment_method_id)
     )
     db.commit()
     flash("Lançamento adicionado com sucesso!", "success")
     return redirect(url_for('lancamentos'))
 
+# --- Consultas dos Relatórios ---
+REPORT_SQL = TRANSACTION_SELECT + "WHERE t.user_id = ? AND t.date >= ? AND t.date <= ?"
+# Pagos no período OU com vencimento no período: a união de duas buscas por faixa, uma em
+# cada índice (user_id, date) e (user_id, due_date), em vez de um OR que percorre todo o histórico.
+DETAILED_REPORT_SQL = TRANSACTION_SELECT + """WHERE t.id IN (
+        SELECT id FROM transactions WHERE user_id = ? AND date >= ? AND date <= ?
+        UNION
+        SELECT id FROM transactions WHERE user_id = ? AND due_date >= ? AND due_date <= ?
+    )
+    ORDER BY t.due_date, t.id
+"""
+
+def detailed_report_params(user_id, start_date_str, end_date_str):
+    return (user_id, start_date_str, end_date_str, user_id, start_date_str, end_date_str)
+
+class ReportRow:
+    """Linha de relatório leve, criada direto da tupla do cursor (row_factory).
+
+    Segue a ordem das colunas de TRANSACTION_SELECT; as datas ficam como texto e só
+    viram datetime quando `date`/`due_date` são lidas.
+    """
+    __slots__ = ('id', 'description', 'amount', 'type', 'category_id', 'category', 'date_text', 'due_date_text',
+                 'status', 'client_id', 'supplier_id', 'client_supplier', 'counterparty',
+                 'payment_method_id', 'transfer_id', 'account', 'account_ref')
+
+    def __init__(self, cursor, values):
+        (self.id, self.description, self.amount, self.type, self.category_id, self.category, self.date_text,
+         self.due_date_text, self.status, self.client_id, self.supplier_id, self.client_supplier, self.counterparty,
+         self.payment_method_id, self.transfer_id, self.account, self.account_ref) = values
+
+    @property
+    def date(self):
+        return parse_date(self.date_text)
+
+    @property
+    def due_date(self):
+        return parse_date(self.due_date_text)
+
+def fetch_report_rows(db, sql, params):
+    cursor = db.cursor()
+    cursor.row_factory = ReportRow
+    return cursor.execute(sql, params).fetchall()
+
+def report_period(args):
+    """Período pedido (start_date, end_date) como texto; por omissão, do dia 1 do mês até hoje."""
+    today = datetime.now()
+    start_date_str = args.get('start_date', today.replace(day=1).strftime('%Y-%m-%d'))
+    end_date_str = args.get('end_date', today.strftime('%Y-%m-%d'))
+    return start_date_str, end_date_str
+
 @app.route('/reports', methods=['GET'])
 @login_required
+@cached_report(lambda: report_period(request.args))
 def reports():
     db = get_db()
     user_id = session['user_id']
-    today = datetime.now()
-    start_date_str = request.args.get('start_date', today.replace(day=1).strftime('%Y-%m-%d'))
-    end_date_str = request.args.get('end_date', today.strftime('%Y-%m-%d'))
+    start_date_str, end_date_str = report_period(request.args)
     start_date = parse_date(start_date_str)
     end_date = parse_date(end_date_str)
 
     report_transactions = []
     if start_date and end_date:
-        end_date_inclusive = end_date.replace(hour=23, minute=59, second=59)
-        transactions_from_db = db.execute(
-            "SELECT * FROM transactions WHERE user_id = ? AND date >= ? AND date <= ?",
-            (user_id, start_date_str, end_date_str)
-        ).fetchall()
+        sql = period_sql(db, user_id, REPORT_SQL, start_date_str)
+        transactions_from_db = db.execute(sql, (user_id, start_date_str, end_date_str)).fetchall()
         for tx_row in transactions_from_db:
             tx_dict = dict(tx_row)
             tx_dict['date'] = parse_date(tx_dict['date'])
@@ -427,8 +2171,8 @@ def reports():
 
     income_transactions = [t for t in report_transactions if t['type'] == 'receita']
     expense_transactions = [t for t in report_transactions if t['type'] == 'despesa']
-    total_income = sum(t['amount'] for t in income_transactions)
-    total_expense = sum(t['amount'] for t in expense_transactions)
+    total_income = Money(sum(t['amount'] for t in income_transactions))
+    total_expense = Money(sum(t['amount'] for t in expense_transactions))
     
     return render_template(
         'reports.html',
@@ -442,31 +2186,24 @@ def reports():
 
 @app.route('/reports/detailed', methods=['GET'])
 @login_required
+@materializes_recurring(lambda: report_period(request.args)[1])
+@cached_report(lambda: report_period(request.args))
 def detailed_report():
     db = get_db()
     user_id = session['user_id']
-    today = datetime.now()
-    start_date_str = request.args.get('start_date', today.replace(day=1).strftime('%Y-%m-%d'))
-    end_date_str = request.args.get('end_date', today.strftime('%Y-%m-%d'))
+    start_date_str, end_date_str = report_period(request.args)
     start_date = parse_date(start_date_str)
     end_date = parse_date(end_date_str)
 
     report_transactions = []
     if start_date and end_date:
-        end_date_inclusive = end_date.replace(hour=23, minute=59, second=59)
-        transactions_from_db = db.execute(
-            "SELECT * FROM transactions WHERE user_id = ? AND ( (date >= ? AND date <= ?) OR (due_date >= ? AND due_date <= ?) ) ORDER BY due_date",
-            (user_id, start_date_str, end_date_str, start_date_str, end_date_str)
-        ).fetchall()
-        
-        for tx_row in transactions_from_db:
-            tx_dict = dict(tx_row)
-            tx_dict['date'] = parse_date(tx_dict['date'])
-            tx_dict['due_date'] = parse_date(tx_dict['due_date'])
-            report_transactions.append(tx_dict)
+        report_transactions = fetch_report_rows(
+            db, period_sql(db, user_id, DETAILED_REPORT_SQL, start_date_str),
+            detailed_report_params(user_id, start_date_str, end_date_str)
+        )
 
-    total_income = sum(t['amount'] for t in report_transactions if t['type'] == 'receita' and t['status'] in ['pago', 'recebido'])
-    total_expense = sum(t['amount'] for t in report_transactions if t['type'] == 'despesa' and t['status'] in ['pago', 'recebido'])
+    total_income = Money(sum(t.amount for t in report_transactions if t.type == 'receita' and t.status in ('pago', 'recebido')))
+    total_expense = Money(sum(t.amount for t in report_transactions if t.type == 'despesa' and t.status in ('pago', 'recebido')))
     balance = total_income - total_expense
 
     return render_template(
@@ -479,6 +2216,670 @@ def detailed_report():
         balance=balance
     )
 
+# --- Exportação (CSV / OFX) ---
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CSV_HEADER = ['id', 'descricao', 'valor', 'tipo', 'categoria', 'data_pagamento', 'vencimento', 'status', 'cliente_fornecedor', 'conta_cartao']
+
+def export_query(db, scope, user_id, args):
+    """Devolve (sql, parâmetros, nome base do ficheiro) do conjunto a exportar, ou None."""
+    if scope == 'lancamentos':
+        conditions, params = ledger_filters(args)
+        where = ''.join(' AND ' + condition for condition in conditions)
+        sql = TRANSACTION_SELECT + f"WHERE t.user_id = ?{where} ORDER BY t.due_date DESC, t.id DESC"
+        return sql, (user_id, *params), 'lancamentos'
+
+    start_date_str, end_date_str = report_period(args)
+    if not (parse_date(start_date_str) and parse_date(end_date_str)):
+        return None
+    filename = f"{scope}_{start_date_str}_{end_date_str}"
+    if scope == 'relatorio':
+        sql = period_sql(db, user_id, REPORT_SQL, start_date_str)
+        return sql + " ORDER BY t.date, t.id", (user_id, start_date_str, end_date_str), filename
+    if scope == 'relatorio_detalhado':
+        return period_sql(db, user_id, DETAILED_REPORT_SQL, start_date_str), detailed_report_params(user_id, start_date_str, end_date_str), filename
+    return None
+
+def iter_batches(cursor):
+    """Percorre um cursor em lotes de EXPORT_BATCH_SIZE, sem carregar o resultado inteiro."""
+    while True:
+        rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+def generate_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_HEADER)
+    for rows in iter_batches(cursor):
+        for row in rows:
+            writer.writerow((
+                row['id'], row['description'], str(Money(row['amount'])), row['type'], row['category'],
+                row['date'] or '', row['due_date'], row['status'], row['client_supplier'] or '', row['account'] or ''
+            ))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def generate_ofx(cursor):
+    now = datetime.now().strftime('%Y%m%d%H%M%S')
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+        '<?OFX OFXHEADER="200" VERSION="220" SECURITY="NONE" OLDFILEUID="NONE" NEWFILEUID="NONE"?>\n'
+        '<OFX><BANKMSGSRSV1><STMTTRNRS><TRNUID>0</TRNUID>'
+        '<STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>'
+        '<STMTRS><CURDEF>BRL</CURDEF>'
+        '<BANKACCTFROM><BANKID>0</BANKID><ACCTID>LIVROCAIXA</ACCTID><ACCTTYPE>CHECKING</ACCTTYPE></BANKACCTFROM>'
+        f'<BANKTRANLIST><DTSTART>{now}</DTSTART><DTEND>{now}</DTEND>\n'
+    )
+    for rows in iter_batches(cursor):
+        parts = []
+        for row in rows:
+            amount = Money(row['amount'] if row['type'] == 'receita' else -row['amount'])
+            posted = (row['date'] or row['due_date']).replace('-', '')
+            parts.append(
+                '<STMTTRN>'
+                f"<TRNTYPE>{'CREDIT' if row['type'] == 'receita' else 'DEBIT'}</TRNTYPE>"
+                f'<DTPOSTED>{posted}</DTPOSTED>'
+                f'<TRNAMT>{amount}</TRNAMT>'
+                f"<FITID>{row['id']}</FITID>"
+                f"<NAME>{xml_escape(row['description'][:32])}</NAME>"
+                f"<MEMO>{xml_escape(row['category'])}</MEMO>"
+                '</STMTTRN>\n'
+            )
+        yield ''.join(parts)
+    yield '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+
+EXPORT_FORMATS = {
+    'csv': (generate_csv, 'text/csv'),
+    'ofx': (generate_ofx, 'application/x-ofx'),
+}
+
+@app.route('/export/<scope>.<fmt>')
+@login_required
+@materializes_recurring(lambda: current_month_end() if request.view_args['scope'] == 'lancamentos' else report_period(request.args)[1])
+def export(scope, fmt):
+    """Exporta lançamentos ou relatórios em streaming, lendo o banco em lotes."""
+    db = get_db()
+    query = export_query(db, scope, session['user_id'], request.args)
+    if query is None or fmt not in EXPORT_FORMATS:
+        flash("Exportação inválida.", "danger")
+        return redirect(url_for('lancamentos'))
+
+    sql, params, filename = query
+    generator, mimetype = EXPORT_FORMATS[fmt]
+    cursor = db.execute(sql, params)
+    return Response(
+        stream_with_context(generator(cursor)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+# --- Livro Caixa (saldo acumulado) ---
+# Só entram no caixa os lançamentos pagos/recebidos, na data do pagamento.
+CASH_SIGNED_AMOUNT = "CASE WHEN type = 'receita' THEN amount ELSE -amount END"
+CASH_BOOK_SQL = TRANSACTION_SELECT + (
+    "WHERE t.user_id = ? AND t.date >= ? AND t.date <= ? AND t.status IN ('pago', 'recebido') "
+    "ORDER BY t.date, t.id"
+)
+
+def shift_month(month, delta):
+    """Soma `delta` meses a 'AAAA-MM'."""
+    year, mon = divmod(int(month[:4]) * 12 + int(month[5:7]) - 1 + delta, 12)
+    return f'{year:04d}-{mon + 1:02d}'
+
+def close_months(db, user_id, last_month, archived=False):
+    """Grava os pontos de controle até `last_month`, partindo do mais próximo já gravado.
+
+    Roda numa transação `BEGIN IMMEDIATE` para que nenhuma escrita concorrente (cujos
+    gatilhos apagam os pontos de controle afetados) aconteça entre a soma e a gravação.
+    Com `archived`, soma também os lançamentos de exercícios fechados.
+    """
+    db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        checkpoint = db.execute(
+            'SELECT month, balance FROM balance_checkpoints WHERE user_id = ? AND month <= ? ORDER BY month DESC LIMIT 1',
+            (user_id, last_month)
+        ).fetchone()
+        balance = checkpoint['balance'] if checkpoint else 0
+        since = shift_month(checkpoint['month'], 1) + '-01' if checkpoint else ''
+        checkpoints = []
+        sql = (
+            f"SELECT substr(date, 1, 7) AS month, SUM({CASH_SIGNED_AMOUNT}) AS total FROM transactions "
+            "WHERE user_id = ? AND date >= ? AND date < ? AND status IN ('pago', 'recebido') "
+            "GROUP BY month ORDER BY month"
+        )
+        for row in db.execute(archive_sql(sql) if archived else sql, (user_id, since, shift_month(last_month, 1) + '-01')):
+            balance += row['total']
+            checkpoints.append((user_id, row['month'], balance))
+        if not checkpoints or checkpoints[-1][1] != last_month:
+            checkpoints.append((user_id, last_month, balance))
+        db.executemany('INSERT OR REPLACE INTO balance_checkpoints (user_id, month, balance) VALUES (?, ?, ?)', checkpoints)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return balance
+
+def opening_balance(db, user_id, start_date, archived=False):
+    """Saldo de caixa antes de `start_date` ('AAAA-MM-DD').
+
+    Usa o ponto de controle do mês anterior (calculando-o a partir do mais próximo, se
+    faltar) e soma só os dias do próprio mês anteriores a `start_date`. O fechamento de
+    exercício grava o ponto de controle de dezembro, então só um período que começa
+    dentro de um exercício fechado precisa de `archived`.
+    """
+    month = start_date[:7]
+    last_month = shift_month(month, -1)
+    checkpoint = db.execute(
+        'SELECT balance FROM balance_checkpoints WHERE user_id = ? AND month = ?', (user_id, last_month)
+    ).fetchone()
+    balance = checkpoint['balance'] if checkpoint else close_months(db, user_id, last_month, archived)
+    sql = (
+        f"SELECT COALESCE(SUM({CASH_SIGNED_AMOUNT}), 0) FROM transactions "
+        "WHERE user_id = ? AND date >= ? AND date < ? AND status IN ('pago', 'recebido')"
+    )
+    balance += db.execute(archive_sql(sql) if archived else sql, (user_id, month + '-01', start_date)).fetchone()[0]
+    return Money(balance)
+
+class CashBookEntries:
+    """Lançamentos do período em ordem de pagamento, cada um com o saldo acumulado.
+
+    Lê o cursor em lotes enquanto o template é enviado; os totais ficam disponíveis
+    depois de percorrida a lista (no rodapé do template).
+    """
+
+    def __init__(self, cursor, opening):
+        self.cursor = cursor
+        self.opening = opening
+        self.balance = opening
+        self.total_income = Money(0)
+        self.total_expense = Money(0)
+
+    def __iter__(self):
+        for rows in iter_batches(self.cursor):
+            for row in rows:
+                amount = Money(row['amount'])
+                if row['type'] == 'receita':
+                    self.total_income += amount
+                    self.balance += amount
+                else:
+                    self.total_expense += amount
+                    self.balance -= amount
+                yield row, self.balance
+
+@app.route('/reports/cash_book', methods=['GET'])
+@login_required
+def cash_book():
+    db = get_db()
+    user_id = session['user_id']
+    start_date_str, end_date_str = report_period(request.args)
+    if not (parse_date(start_date_str) and parse_date(end_date_str)):
+        flash("Período inválido.", "danger")
+        return redirect(url_for('reports'))
+
+    archived = reaches_archive(db, user_id, start_date_str)
+    opening = opening_balance(db, user_id, start_date_str, archived)
+    sql = archive_sql(CASH_BOOK_SQL) if archived else CASH_BOOK_SQL
+    entries = CashBookEntries(db.execute(sql, (user_id, start_date_str, end_date_str)), opening)
+    return Response(stream_template(
+        'cash_book.html',
+        start_date=start_date_str,
+        end_date=end_date_str,
+        entries=entries
+    ))
+
+# --- Fechamento de Exercício ---
+# Lançamentos de exercícios fechados ficam em `transactions_archive` (migração 0013). As
+# rotas do dia a dia leem só `transactions`; as consultas de um período que alcança o
+# arquivo trocam a tabela pela visão `all_transactions`.
+ARCHIVE_SOURCE = re.compile(r'\bFROM transactions\b')
+FiscalClosing = namedtuple('FiscalClosing', ['year', 'archived_count', 'income', 'expense', 'closing_balance'])
+
+def archive_sql(sql):
+    """A mesma consulta, lendo também os lançamentos arquivados."""
+    return ARCHIVE_SOURCE.sub('FROM all_transactions', sql)
+
+REACHES_ARCHIVE_SQL = (
+    'SELECT EXISTS (SELECT 1 FROM transactions_archive WHERE user_id = ? AND date >= ?) '
+    'OR EXISTS (SELECT 1 FROM transactions_archive WHERE user_id = ? AND due_date >= ?)'
+)
+
+def reaches_archive(db, user_id, start_date):
+    """Se algum lançamento arquivado foi pago ou vence a partir de `start_date` (duas buscas por índice)."""
+    return db.execute(REACHES_ARCHIVE_SQL, (user_id, start_date, user_id, start_date)).fetchone()[0]
+
+def period_sql(db, user_id, sql, start_date):
+    """`sql` para um período a partir de `start_date`, incluindo o arquivo só quando ele é alcançado."""
+    return archive_sql(sql) if reaches_archive(db, user_id, start_date) else sql
+
+def closed_through(db, user_id):
+    """Último exercício fechado do usuário (ano), ou None."""
+    return db.execute('SELECT MAX(year) FROM fiscal_closings WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+def check_open_period(db, user_id, day):
+    """Levanta ValueError se `day` ('AAAA-MM-DD') cai num exercício fechado."""
+    closed = closed_through(db, user_id)
+    if closed is not None and day and day[:4].isdigit() and int(day[:4]) <= closed:
+        raise ValueError(f"O exercício de {day[:4]} está fechado e não aceita lançamentos.")
+
+def close_fiscal_year(db, user_id, year):
+    """Fecha o exercício `year`: grava os totais e o saldo final e arquiva os lançamentos do ano.
+
+    Os exercícios são fechados em ordem e só depois de encerrados, sem lançamentos pendentes
+    até 31/12. Tudo roda numa transação `BEGIN IMMEDIATE`; durante o arquivamento o usuário
+    fica em `archiving_users`, para que os gatilhos de exclusão não descontem os lançamentos
+    arquivados do resumo mensal, dos pontos de controle do caixa e dos saldos das contas.
+    Levanta ValueError se o exercício não puder ser fechado.
+    """
+    if year >= datetime.now().year:
+        raise ValueError("Só é possível fechar exercícios já encerrados.")
+    year_start, year_end = f'{year:04d}-01-01', f'{year:04d}-12-31'
+
+    db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        closed = closed_through(db, user_id)
+        if closed is not None and year <= closed:
+            raise ValueError(f"O exercício de {year} já está fechado.")
+        pending = db.execute(
+            "SELECT COUNT(*) FROM transactions WHERE user_id = ? AND due_date <= ? AND status = 'pendente'", (user_id, year_end)
+        ).fetchone()[0]
+        if pending:
+            raise ValueError(f"Há {pending} lançamento(s) pendente(s) até 31/12/{year}; baixe-os ou exclua-os antes de fechar.")
+        # Sem pendentes, todo lançamento até 31/12 tem data de pagamento.
+        earlier = db.execute('SELECT MIN(date) FROM transactions WHERE user_id = ? AND date < ?', (user_id, year_start)).fetchone()[0]
+        if earlier:
+            raise ValueError(f"Feche antes o exercício de {earlier[:4]}.")
+
+        # Transferências entre contas (`transfer_id`) não são receita nem despesa, como no
+        # dashboard; as duas pernas se anulam no saldo final, mas são arquivadas e contadas.
+        income, expense, count = db.execute(
+            "SELECT COALESCE(SUM(CASE WHEN type = 'receita' AND transfer_id IS NULL THEN amount END), 0), "
+            "COALESCE(SUM(CASE WHEN type = 'despesa' AND transfer_id IS NULL THEN amount END), 0), COUNT(*) "
+            "FROM transactions WHERE user_id = ? AND date <= ?", (user_id, year_end)
+        ).fetchone()
+        previous = db.execute(
+            'SELECT closing_balance FROM fiscal_closings WHERE user_id = ? AND year = ?', (user_id, closed)
+        ).fetchone()
+        closing_balance = (previous['closing_balance'] if previous else 0) + income - expense
+
+        db.execute('INSERT INTO archiving_users (user_id) VALUES (?)', (user_id,))
+        db.execute(
+            'INSERT INTO fiscal_closing_totals (user_id, year, category_id, type, total, count) '
+            'SELECT user_id, ?, category_id, type, SUM(amount), COUNT(*) FROM transactions '
+            'WHERE user_id = ? AND date <= ? AND transfer_id IS NULL GROUP BY category_id, type',
+            (year, user_id, year_end)
+        )
+        db.execute(
+            'INSERT INTO transactions_archive SELECT id, user_id, description, amount, type, category_id, date, due_date, '
+            'status, client_id, supplier_id, recurring_rule_id, account_id, credit_card_id, payment_method_id, transfer_id '
+            'FROM transactions WHERE user_id = ? AND date <= ?',
+            (user_id, year_end)
+        )
+        db.execute('DELETE FROM transactions WHERE user_id = ? AND date <= ?', (user_id, year_end))
+        db.execute('DELETE FROM archiving_users WHERE user_id = ?', (user_id,))
+        db.execute(
+            'INSERT OR REPLACE INTO balance_checkpoints (user_id, month, balance) VALUES (?, ?, ?)',
+            (user_id, f'{year:04d}-12', closing_balance)
+        )
+        # Regras recorrentes não geram mais vencimentos no exercício fechado.
+        db.execute(
+            'UPDATE recurring_rules SET materialized_until = ? WHERE user_id = ? AND materialized_until < ?',
+            (year_end, user_id, year_end)
+        )
+        db.execute(
+            'INSERT INTO fiscal_closings (user_id, year, closed_at, income, expense, closing_balance, archived_count) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (user_id, year, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), income, expense, closing_balance, count)
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return FiscalClosing(year, count, Money(income), Money(expense), Money(closing_balance))
+
+@app.route('/fechamento', methods=['GET', 'POST'])
+@login_required
+def fiscal_closings():
+    """Exercícios fechados do usuário, com os totais por categoria, e o fechamento do próximo."""
+    db = get_db()
+    user_id = session['user_id']
+
+    if request.method == 'POST':
+        year = request.form.get('year', type=int)
+        try:
+            if year is None:
+                raise ValueError("Ano inválido.")
+            closing = close_fiscal_year(db, user_id, year)
+        except ValueError as e:
+            flash(str(e), "danger")
+        else:
+            flash(
+                f"Exercício de {closing.year} fechado: {closing.archived_count} lançamento(s) arquivado(s), "
+                f"saldo final R$ {closing.closing_balance}.", "success"
+            )
+        return redirect(url_for('fiscal_closings'))
+
+    closings = db.execute('SELECT * FROM fiscal_closings WHERE user_id = ? ORDER BY year DESC', (user_id,)).fetchall()
+    totals = defaultdict(list)
+    for row in db.execute(
+        'SELECT f.year, f.type, f.total, f.count, c.name AS category FROM fiscal_closing_totals f '
+        'JOIN categories c ON c.id = f.category_id WHERE f.user_id = ? ORDER BY f.year, f.type DESC, f.total DESC',
+        (user_id,)
+    ):
+        totals[row['year']].append(row)
+
+    closed = closed_through(db, user_id)
+    if closed is None:
+        first = db.execute('SELECT MIN(date) FROM transactions WHERE user_id = ?', (user_id,)).fetchone()[0]
+        next_year = int(first[:4]) if first else datetime.now().year - 1
+    else:
+        next_year = closed + 1
+    return render_template(
+        'fechamento.html',
+        closings=closings,
+        totals=totals,
+        next_year=next_year,
+        can_close=next_year < datetime.now().year
+    )
+
+@app.cli.command('close-year')
+@click.argument('year', type=int)
+@click.argument('username')
+def close_year_command(year, username):
+    """Fecha o exercício YEAR de USERNAME e arquiva os seus lançamentos."""
+    db = get_db()
+    user = db.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if user is None:
+        raise click.ClickException(f"Usuário '{username}' não encontrado.")
+    try:
+        closing = close_fiscal_year(db, user['id'], year)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"Exercício de {closing.year} fechado: {closing.archived_count} lançamentos arquivados, "
+          f"receitas {closing.income}, despesas {closing.expense}, saldo final {closing.closing_balance}.")
+
+# --- Importação de Extratos (CSV / OFX) ---
+IMPORT_BATCH_SIZE = 500
+IMPORT_DEFAULT_CATEGORIES = {'receita': 'Outras Receitas', 'despesa': 'Outras Despesas Operacionais'}
+# Nomes de coluna aceitos no CSV (normalizados em minúsculas, sem acentos) para cada campo.
+IMPORT_CSV_COLUMNS = {
+    'description': ('descricao', 'description', 'historico', 'memo', 'nome'),
+    'amount': ('valor', 'amount', 'quantia'),
+    'type': ('tipo', 'type'),
+    'category': ('categoria', 'category'),
+    'date': ('data_pagamento', 'data', 'date', 'pagamento'),
+    'due_date': ('vencimento', 'due_date', 'data_vencimento'),
+    'status': ('status', 'situacao'),
+    'client_supplier': ('cliente_fornecedor', 'client_supplier', 'cliente', 'fornecedor', 'favorecido'),
+}
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+StatementRow = namedtuple('StatementRow', [
+    'description', 'amount', 'type', 'category', 'date', 'due_date', 'status', 'client_supplier'
+])
+ImportResult = namedtuple('ImportResult', ['read', 'inserted', 'duplicates', 'errors'])
+
+def transaction_fingerprint(date, due_date, tx_type, cents, description):
+    """Mesma expressão da coluna gerada `transactions.fingerprint` (lower/trim ASCII do SQLite)."""
+    return f"{date or due_date}|{tx_type}|{cents}|{description.strip(' ').translate(ASCII_LOWER)}"
+
+def normalize_header(name):
+    name = unicodedata.normalize('NFKD', (name or '').strip().lower())
+    return ''.join(ch for ch in name if not unicodedata.combining(ch)).replace(' ', '_')
+
+def parse_statement_date(text):
+    """Aceita 'AAAA-MM-DD', 'DD/MM/AAAA' e o formato OFX 'AAAAMMDD[hhmmss...]'."""
+    text = (text or '').strip()
+    for fmt, value in (('%Y-%m-%d', text[:10]), ('%d/%m/%Y', text[:10]), ('%Y%m%d', text[:8])):
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+def parse_statement_amount(text):
+    """Converte '1.234,56', '1234.56' ou '-12,30' em centavos com sinal."""
+    text = (text or '').strip().replace('R$', '').replace(' ', '')
+    if ',' in text and '.' in text:
+        text = text.replace('.', '') if text.rfind(',') > text.rfind('.') else text.replace(',', '')
+    return Money.parse(text).cents
+
+def statement_row(description, signed_cents, tx_type=None, category=None, date=None,
+                  due_date=None, status=None, client_supplier=None):
+    tx_type = tx_type if tx_type in ('receita', 'despesa') else ('receita' if signed_cents >= 0 else 'despesa')
+    if status not in ('pago', 'recebido', 'pendente'):
+        status = ('recebido' if tx_type == 'receita' else 'pago') if date else 'pendente'
+    return StatementRow(
+        description=(description or '').strip() or 'Lançamento importado',
+        amount=abs(signed_cents), type=tx_type, category=(category or '').strip() or None,
+        date=date if status != 'pendente' else None, due_date=due_date or date,
+        status=status, client_supplier=(client_supplier or '').strip() or None
+    )
+
+def parse_csv_statement(lines):
+    """Lê um CSV linha a linha (separador ',' ou ';') e gera StatementRow ou ValueError."""
+    lines = iter(lines)
+    header_line = next(lines, '')
+    delimiter = ';' if header_line.count(';') > header_line.count(',') else ','
+    header = [normalize_header(h) for h in next(csv.reader([header_line], delimiter=delimiter))]
+    positions = {}
+    for field, aliases in IMPORT_CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in header:
+                positions[field] = header.index(alias)
+                break
+    if 'amount' not in positions or not ('date' in positions or 'due_date' in positions):
+        raise ValueError("O CSV precisa de colunas de valor e de data.")
+
+    for record in csv.reader(lines, delimiter=delimiter):
+        if not any(record):
+            continue
+        get = lambda field: record[positions[field]] if field in positions and positions[field] < len(record) else None
+        try:
+            date = parse_statement_date(get('date'))
+            due_date = parse_statement_date(get('due_date'))
+            if not (date or due_date):
+                raise ValueError(f"Data inválida na linha: {record}")
+            yield statement_row(
+                get('description'), parse_statement_amount(get('amount')), (get('type') or '').strip().lower(),
+                get('category'), date, due_date, (get('status') or '').strip().lower(), get('client_supplier')
+            )
+        except ValueError as e:
+            yield e
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+def parse_ofx_statement(lines):
+    """Lê blocos <STMTTRN> de um OFX (SGML 1.x ou XML 2.x) linha a linha."""
+    current = None
+    for line in lines:
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN' and not closing:
+                current = {}
+            elif tag == 'STMTTRN' and closing and current is not None:
+                try:
+                    date = parse_statement_date(current.get('DTPOSTED'))
+                    if not date:
+                        raise ValueError(f"Data inválida no OFX: {current}")
+                    yield statement_row(
+                        current.get('NAME') or current.get('MEMO'), parse_statement_amount(current.get('TRNAMT')),
+                        date=date, client_supplier=current.get('PAYEE')
+                    )
+                except ValueError as e:
+                    yield e
+                current = None
+            elif current is not None and not closing:
+                current[tag] = html.unescape(value.strip())
+
+def import_lookups(db, user_id):
+    """Ids das categorias, clientes e fornecedores do usuário por nome."""
+    categories = {row['name'].lower(): row['id'] for row in db.execute('SELECT id, name FROM categories WHERE user_id = ?', (user_id,))}
+    clients = {row['name'].lower(): row['id'] for row in db.execute('SELECT id, name FROM clients WHERE user_id = ?', (user_id,))}
+    suppliers = {row['name'].lower(): row['id'] for row in db.execute('SELECT id, name FROM suppliers WHERE user_id = ?', (user_id,))}
+    return categories, clients, suppliers
+
+DESCRIPTION_HISTORY_SQL = (
+    'SELECT lower(description) AS description, category_id, client_id, supplier_id, MAX(due_date) FROM transactions '
+    'WHERE user_id = ? AND lower(description) IN (SELECT value FROM json_each(?)) GROUP BY lower(description)'
+)
+
+def description_history(db, user_id, descriptions):
+    """Descrição -> (categoria, cliente, fornecedor) do último lançamento com cada uma das `descriptions`.
+
+    Busca só as descrições do lote (índice em lower(description)); com MAX(due_date), o
+    SQLite devolve as demais colunas da linha do vencimento mais recente.
+    """
+    return {
+        row['description']: (row['category_id'], row['client_id'], row['supplier_id'])
+        for row in db.execute(DESCRIPTION_HISTORY_SQL, (user_id, json.dumps(sorted(descriptions))))
+    }
+
+def import_statement(db, user_id, rows, progress=None):
+    """Grava os lançamentos de um extrato em lotes, ignorando os que já existem.
+
+    A deduplicação compara a impressão digital de cada linha com o índice
+    (user_id, fingerprint); linhas idênticas repetidas no mesmo ficheiro só são
+    ignoradas até o número de cópias já existentes no banco. Categorias e
+    clientes/fornecedores desconhecidos são cadastrados só para as linhas incluídas.
+    Linhas de exercícios fechados entram como erro.
+    """
+    categories, clients, suppliers = import_lookups(db, user_id)
+    closed = closed_through(db, user_id)
+    existing_counts, seen_counts = {}, defaultdict(int)
+    read = inserted = duplicates = 0
+    errors = []
+
+    def category_id_for(name):
+        if name.lower() not in categories:
+            cursor = db.execute(
+                'INSERT INTO categories (user_id, name, category_group) VALUES (?, ?, ?)',
+                (user_id, name, 'Categorias Personalizadas')
+            )
+            categories[name.lower()] = cursor.lastrowid
+        return categories[name.lower()]
+
+    def counterparty_for(name, transaction_type):
+        # Um nome cadastrado nos dois lados vale como cliente nas receitas e fornecedor nas despesas.
+        key = name.lower()
+        if key in clients and (transaction_type == 'receita' or key not in suppliers):
+            return clients[key], None
+        if key in suppliers:
+            return None, suppliers[key]
+        if transaction_type == 'receita':
+            clients[key] = db.execute('INSERT INTO clients (user_id, name) VALUES (?, ?)', (user_id, name)).lastrowid
+            return clients[key], None
+        suppliers[key] = db.execute('INSERT INTO suppliers (user_id, name) VALUES (?, ?)', (user_id, name)).lastrowid
+        return None, suppliers[key]
+
+    def flush(batch):
+        nonlocal inserted, duplicates
+        fingerprints = [fp for fp, _ in batch if fp not in existing_counts]
+        for start in range(0, len(fingerprints), 500):
+            chunk = fingerprints[start:start + 500]
+            existing_counts.update(dict.fromkeys(chunk, 0))
+            placeholders = ','.join('?' * len(chunk))
+            for row in db.execute(
+                f'SELECT fingerprint, COUNT(*) FROM transactions WHERE user_id = ? AND fingerprint IN ({placeholders}) GROUP BY fingerprint',
+                (user_id, *chunk)
+            ):
+                existing_counts[row[0]] = row[1]
+
+        history = description_history(db, user_id, {row.description.lower() for _, row in batch})
+        values = []
+        for fp, row in batch:
+            seen_counts[fp] += 1
+            if seen_counts[fp] <= existing_counts[fp]:
+                duplicates += 1
+                continue
+            known_category, known_client, known_supplier = history.get(row.description.lower(), (None, None, None))
+            if row.category or not known_category:
+                category_id = category_id_for(row.category or IMPORT_DEFAULT_CATEGORIES[row.type])
+            else:
+                category_id = known_category
+            if row.client_supplier:
+                client_id, supplier_id = counterparty_for(row.client_supplier, row.type)
+            else:
+                client_id, supplier_id = known_client, known_supplier
+            values.append((user_id, row.description, row.amount, row.type, category_id, row.date, row.due_date, row.status, client_id, supplier_id))
+        db.executemany(
+            'INSERT INTO transactions (user_id, description, amount, type, category_id, date, due_date, status, client_id, supplier_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', values
+        )
+        db.commit()
+        inserted += len(values)
+        if progress:
+            progress(read, inserted, duplicates)
+
+    batch = []
+    for row in rows:
+        if isinstance(row, ValueError):
+            errors.append(str(row))
+            continue
+        read += 1
+        day = row.date or row.due_date
+        if closed is not None and day and int(day[:4]) <= closed:
+            errors.append(f"{row.description} ({br_date(day)}): o exercício de {day[:4]} está fechado.")
+            continue
+        batch.append((transaction_fingerprint(row.date, row.due_date, row.type, row.amount, row.description), row))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    db.commit()
+    return ImportResult(read, inserted, duplicates, errors)
+
+def statement_parser(filename):
+    return parse_ofx_statement if filename.lower().endswith('.ofx') else parse_csv_statement
+
+@app.route('/import', methods=['POST'])
+@login_required
+def import_transactions():
+    """Importa um extrato bancário (CSV ou OFX) enviado pelo formulário de lançamentos."""
+    upload = request.files.get('statement')
+    if not upload or not upload.filename:
+        flash("Selecione um ficheiro CSV ou OFX para importar.", "warning")
+        return redirect(url_for('lancamentos'))
+
+    lines = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', errors='replace')
+    try:
+        result = import_statement(get_db(), session['user_id'], statement_parser(upload.filename)(lines))
+    except ValueError as e:
+        flash(f"Não foi possível importar o extrato: {e}", "danger")
+        return redirect(url_for('lancamentos'))
+
+    flash(
+        f"Importação concluída: {result.inserted} lançamento(s) incluído(s), "
+        f"{result.duplicates} já existente(s) ignorado(s), {len(result.errors)} linha(s) com erro.",
+        "success" if not result.errors else "warning"
+    )
+    return redirect(url_for('lancamentos'))
+
+@app.cli.command('import-statement')
+@click.argument('path')
+@click.argument('username')
+def import_statement_command(path, username):
+    """Importa um extrato CSV/OFX para USERNAME, mostrando o progresso."""
+    db = get_db()
+    user = db.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if user is None:
+        raise click.ClickException(f"Usuário '{username}' não encontrado.")
+
+    def progress(read, inserted, duplicates):
+        print(f"{read} lidos, {inserted} incluídos, {duplicates} duplicados...")
+
+    with open(path, encoding='utf-8-sig', errors='replace') as f:
+        result = import_statement(db, user['id'], statement_parser(path)(f), progress)
+    for error in result.errors:
+        print(f"Erro: {error}")
+    print(f"Concluído: {result.inserted} incluídos, {result.duplicates} duplicados, {len(result.errors)} erros.")
+
 @app.route('/edit/<int:tx_id>', methods=['POST'])
 @login_required
 def edit_transaction(tx_id):
@@ -489,13 +2890,25 @@ def edit_transaction(tx_id):
     if transaction is None:
         flash("Lançamento não encontrado ou não pertence a você.", "danger")
         return redirect(url_for('lancamentos'))
+    if transaction['transfer_id'] is not None:
+        flash(TRANSFER_LOCKED_MESSAGE, "warning")
+        return redirect(url_for('lancamentos'))
+
+    try:
+        amount = Money.parse(request.form['amount'])
+    except ValueError:
+        flash("Valor inválido.", "danger")
+        return redirect(url_for('lancamentos'))
+    try:
+        category_id, client_id, supplier_id = transaction_references(db, user_id, request.form)
+        account_id, credit_card_id, payment_method_id = payment_references(db, user_id, request.form)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for('lancamentos'))
 
     description = request.form['description']
-    amount = float(request.form['amount'])
     due_date = request.form['due_date']
-    category = request.form['category']
     transaction_type = request.form['type']
-    client_supplier = request.form.get('client_supplier')
     is_paid = 'is_paid' in request.form
     payment_date = request.form.get('date')
 
@@ -506,10 +2919,17 @@ def edit_transaction(tx_id):
     else:
         status = 'pendente'
         payment_date = None
+    try:
+        check_open_period(db, user_id, payment_date or due_date)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for('lancamentos'))
 
     db.execute(
-        'UPDATE transactions SET description = ?, amount = ?, type = ?, category = ?, date = ?, due_date = ?, status = ?, client_supplier = ? WHERE id = ?',
-        (description, amount, transaction_type, category, payment_date, due_date, status, client_supplier, tx_id)
+        'UPDATE transactions SET description = ?, amount = ?, type = ?, category_id = ?, date = ?, due_date = ?, status = ?, client_id = ?, supplier_id = ?, '
+        'account_id = ?, credit_card_id = ?, payment_method_id = ? WHERE id = ?',
+        (description, amount.cents, transaction_type, category_id, payment_date, due_date, status, client_id, supplier_id,
+         account_id, credit_card_id, payment_method_id, tx_id)
     )
     db.commit()
     flash("Lançamento atualizado com sucesso!", "success")
@@ -525,6 +2945,9 @@ def update_status(tx_id):
     if transaction is None:
         flash("Lançamento não encontrado ou não pertence a você.", "danger")
         return redirect(url_for('lancamentos'))
+    if transaction['transfer_id'] is not None:
+        flash(TRANSFER_LOCKED_MESSAGE, "warning")
+        return redirect(url_for('lancamentos'))
 
     status = 'recebido' if transaction['type'] == 'receita' else 'pago'
     payment_date = datetime.now().strftime('%Y-%m-%d')
@@ -543,9 +2966,13 @@ def delete_transaction(tx_id):
     db = get_db()
     user_id = session['user_id']
     
-    transaction = db.execute('SELECT id FROM transactions WHERE id = ? AND user_id = ?', (tx_id, user_id)).fetchone()
+    transaction = db.execute('SELECT id, transfer_id FROM transactions WHERE id = ? AND user_id = ?', (tx_id, user_id)).fetchone()
     if transaction:
-        db.execute('DELETE FROM transactions WHERE id = ?', (tx_id,))
+        # Excluir uma perna de transferência exclui também a outra.
+        if transaction['transfer_id'] is not None:
+            db.execute('DELETE FROM transactions WHERE transfer_id = ? AND user_id = ?', (transaction['transfer_id'], user_id))
+        else:
+            db.execute('DELETE FROM transactions WHERE id = ?', (tx_id,))
         db.commit()
         flash("Lançamento excluído com sucesso.", "info")
     else:
@@ -553,6 +2980,216 @@ def delete_transaction(tx_id):
         
     return redirect(url_for('lancamentos'))
 
+# --- Contas, Cartões e Transferências ---
+TRANSFER_GROUP = 'Transferências'
+TRANSFER_CATEGORY = 'Transferências entre Contas'
+NEXT_TRANSFER_ID_SQL = 'INSERT INTO transfer_sequence DEFAULT VALUES'
+TRANSFER_LOCKED_MESSAGE = "Transferências não podem ser editadas nem baixadas; exclua e lance novamente."
+
+# Saldos esperados em `account_balances`, recalculados a partir dos lançamentos pagos/recebidos
+# (inclusive os arquivados no fechamento de exercício).
+ACCOUNT_BALANCE_AGGREGATE_SQL = f"""
+    SELECT user_id, 'conta' AS kind, account_id AS ref_id, SUM({CASH_SIGNED_AMOUNT}) AS balance
+    FROM all_transactions WHERE account_id IS NOT NULL AND status IN ('pago', 'recebido') GROUP BY user_id, account_id
+    UNION ALL
+    SELECT user_id, 'cartao', credit_card_id, SUM({CASH_SIGNED_AMOUNT})
+    FROM all_transactions WHERE credit_card_id IS NOT NULL AND status IN ('pago', 'recebido') GROUP BY user_id, credit_card_id
+"""
+
+def rebuild_account_balances(db):
+    """Recalcula `account_balances` a partir dos lançamentos."""
+    db.execute('DELETE FROM account_balances')
+    db.execute('INSERT INTO account_balances (user_id, kind, ref_id, balance) ' + ACCOUNT_BALANCE_AGGREGATE_SQL)
+    db.commit()
+
+def verify_account_balances(db):
+    """Compara `account_balances` com os lançamentos e devolve as chaves divergentes."""
+    key = lambda row: (row['user_id'], row['kind'], row['ref_id'])
+    expected = {key(row): row['balance'] for row in db.execute(ACCOUNT_BALANCE_AGGREGATE_SQL)}
+    stored = {key(row): row['balance'] for row in db.execute('SELECT * FROM account_balances')}
+    return [
+        (balance_key, expected.get(balance_key, 0), stored.get(balance_key, 0))
+        for balance_key in expected.keys() | stored.keys()
+        if expected.get(balance_key, 0) != stored.get(balance_key, 0)
+    ]
+
+# Contas e cartões do usuário com o saldo lido de `account_balances` (zero se nunca movimentados).
+ACCOUNT_BALANCES_SQL = """
+    SELECT 'conta' AS kind, a.id, a.name, COALESCE(b.balance, 0) AS balance
+    FROM accounts a
+    LEFT JOIN account_balances b ON b.user_id = a.user_id AND b.kind = 'conta' AND b.ref_id = a.id
+    WHERE a.user_id = ?
+    UNION ALL
+    SELECT 'cartao', cc.id, cc.name, COALESCE(b.balance, 0)
+    FROM credit_cards cc
+    LEFT JOIN account_balances b ON b.user_id = cc.user_id AND b.kind = 'cartao' AND b.ref_id = cc.id
+    WHERE cc.user_id = ?
+    ORDER BY kind DESC, name
+"""
+
+def fetch_account_balances(db, user_id):
+    return db.execute(ACCOUNT_BALANCES_SQL, (user_id, user_id)).fetchall()
+
+def transfer_category_id(db, user_id):
+    """Categoria das transferências do usuário, criada na primeira transferência."""
+    category = db.execute(
+        'SELECT id FROM categories WHERE user_id = ? AND category_group = ? AND name = ?',
+        (user_id, TRANSFER_GROUP, TRANSFER_CATEGORY)
+    ).fetchone()
+    if category is not None:
+        return category['id']
+    return db.execute(
+        'INSERT INTO categories (user_id, name, category_group) VALUES (?, ?, ?)', (user_id, TRANSFER_CATEGORY, TRANSFER_GROUP)
+    ).lastrowid
+
+@app.route('/transferencia', methods=['POST'])
+@login_required
+def add_transfer():
+    """Transferência entre contas/cartões: uma despesa paga na origem e uma receita recebida no destino."""
+    db = get_db()
+    user_id = session['user_id']
+
+    try:
+        amount = Money.parse(request.form['amount'])
+    except ValueError:
+        flash("Valor inválido.", "danger")
+        return redirect(url_for('lancamentos'))
+    try:
+        source = account_reference(db, user_id, request.form.get('source'))
+        destination = account_reference(db, user_id, request.form.get('destination'))
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for('lancamentos'))
+    if source == (None, None) or destination == (None, None) or source == destination or amount.cents <= 0:
+        flash("Escolha origem e destino diferentes e um valor positivo.", "danger")
+        return redirect(url_for('lancamentos'))
+
+    transfer_date = parse_date(request.form.get('date')) or datetime.now()
+    transfer_date = transfer_date.strftime('%Y-%m-%d')
+    description = request.form.get('description', '').strip() or 'Transferência'
+    try:
+        check_open_period(db, user_id, transfer_date)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for('lancamentos'))
+
+    # As duas pernas e o identificador (da sequência própria) entram numa só transação.
+    db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        transfer_id = db.execute(NEXT_TRANSFER_ID_SQL).lastrowid
+        db.execute('DELETE FROM transfer_sequence WHERE id = ?', (transfer_id,))
+        category_id = transfer_category_id(db, user_id)
+        db.executemany(
+            'INSERT INTO transactions (user_id, description, amount, type, category_id, date, due_date, status, '
+            'account_id, credit_card_id, transfer_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (user_id, description, amount.cents, 'despesa', category_id, transfer_date, transfer_date, 'pago', *source, transfer_id),
+                (user_id, description, amount.cents, 'receita', category_id, transfer_date, transfer_date, 'recebido', *destination, transfer_id),
+            ]
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    flash("Transferência registrada com sucesso!", "success")
+    return redirect(url_for('lancamentos'))
+
+# --- Operações em Lote ---
+BATCH_ACTIONS = ('pagar', 'excluir', 'recategorizar')
+
+def ledger_filter_args(data):
+    """Filtros da listagem presentes em `data`, para voltar à mesma visão após a ação."""
+    return {key: data[key] for key in LEDGER_FILTER_ARGS if data.get(key)}
+
+def batch_selection(user_id, data, ids):
+    """Condição SQL dos lançamentos escolhidos: uma lista de ids ou os filtros da listagem.
+
+    A posse é conferida na própria instrução (t.user_id = ?), sem SELECT prévio. Sem ids,
+    só aceita aplicar aos filtros com `apply_to_filter` explícito.
+    """
+    if ids:
+        try:
+            ids = [int(tx_id) for tx_id in ids]
+        except (TypeError, ValueError):
+            raise ValueError("Lista de lançamentos inválida.")
+        # '+t.user_id' impede o uso dos índices por usuário: com a lista, a busca é pela chave primária.
+        return '+t.user_id = ? AND t.id IN (SELECT value FROM json_each(?))', [user_id, json.dumps(ids)]
+    if str(data.get('apply_to_filter', '')).lower() in ('1', 'true', 'on'):
+        conditions, params = ledger_filters(data)
+        return ' AND '.join(['t.user_id = ?', *conditions]), [user_id, *params]
+    raise ValueError("Selecione ao menos um lançamento.")
+
+def apply_batch(db, user_id, action, data, ids):
+    """Aplica a ação aos lançamentos escolhidos numa única instrução e devolve quantos mudaram."""
+    if action not in BATCH_ACTIONS:
+        raise ValueError("Ação em lote inválida.")
+    where, params = batch_selection(user_id, data, ids)
+
+    if action == 'pagar':
+        sql = (
+            "UPDATE transactions AS t SET status = CASE WHEN t.type = 'receita' THEN 'recebido' ELSE 'pago' END, "
+            f"date = ? WHERE {where} AND t.status = 'pendente'"
+        )
+        params = [datetime.now().strftime('%Y-%m-%d'), *params]
+    elif action == 'excluir':
+        # As transferências saem inteiras: a outra perna é excluída mesmo fora da seleção.
+        sql = (
+            f"DELETE FROM transactions AS t WHERE {where} OR (t.user_id = ? AND t.transfer_id IN "
+            f"(SELECT t.transfer_id FROM transactions AS t WHERE {where} AND t.transfer_id IS NOT NULL))"
+        )
+        params = [*params, user_id, *params]
+    else:
+        assignments, values = [], []
+        if data.get('category_id'):
+            category = db.execute(
+                'SELECT id FROM categories WHERE id = ? AND user_id = ?', (data['category_id'], user_id)
+            ).fetchone()
+            if category is None:
+                raise ValueError("Categoria inválida.")
+            assignments.append('category_id = ?')
+            values.append(category['id'])
+        # Cliente/fornecedor: vazio mantém o atual, 'nenhum' remove, 'cliente:ID'/'fornecedor:ID' troca.
+        counterparty = data.get('counterparty') or ''
+        if counterparty:
+            assignments.append('client_id = ?, supplier_id = ?')
+            values.extend(counterparty_reference(db, user_id, counterparty) if counterparty != 'nenhum' else (None, None))
+        if not assignments:
+            raise ValueError("Escolha a nova categoria ou o novo cliente/fornecedor.")
+        sql = f"UPDATE transactions AS t SET {', '.join(assignments)} WHERE {where} AND t.transfer_id IS NULL"
+        params = [*values, *params]
+
+    affected = db.execute(sql, params).rowcount
+    db.commit()
+    return affected
+
+@app.route('/lancamentos/lote', methods=['POST'])
+@login_required
+def batch_transactions():
+    """Marca como pagos, exclui ou recategoriza vários lançamentos de uma vez.
+
+    Aceita o formulário da listagem (ids marcados ou "aplicar aos filtros") ou JSON com
+    `action`, `ids` ou `apply_to_filter` + filtros, e `category_id`/`counterparty`.
+    Em JSON devolve {"action", "affected"}.
+    """
+    data = request.get_json(silent=True) if request.is_json else request.form
+    data = data or {}
+    ids = data.get('ids') if request.is_json else request.form.getlist('ids')
+    action = data.get('action')
+    try:
+        affected = apply_batch(get_db(), session['user_id'], action, data, ids)
+    except ValueError as e:
+        if request.is_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), "danger")
+        return redirect(url_for('lancamentos', **ledger_filter_args(data)))
+
+    if request.is_json:
+        return jsonify({'action': action, 'affected': affected})
+    messages = {'pagar': "marcado(s) como pago(s)", 'excluir': "excluído(s)", 'recategorizar': "atualizado(s)"}
+    flash(f"{affected} lançamento(s) {messages[action]}.", "success" if affected else "info")
+    return redirect(url_for('lancamentos', **ledger_filter_args(data)))
+
 # --- Rotas de Cadastro ---
 @app.route('/cadastro')
 @login_required
@@ -566,6 +3203,13 @@ def cadastro():
     payment_methods = db.execute('SELECT * FROM payment_methods WHERE user_id = ? ORDER BY name', (user_id,)).fetchall()
     clients = db.execute('SELECT * FROM clients WHERE user_id = ? ORDER BY name', (user_id,)).fetchall()
     suppliers = db.execute('SELECT * FROM suppliers WHERE user_id = ? ORDER BY name', (user_id,)).fetchall()
+    recurring_rules = db.execute(
+        'SELECT r.*, c.name AS category FROM recurring_rules r JOIN categories c ON c.id = r.category_id '
+        'WHERE r.user_id = ? ORDER BY r.description', (user_id,)
+    ).fetchall()
+    categories_grouped = defaultdict(list)
+    for cat in sorted(categories, key=lambda cat: cat['category_group']):
+        categories_grouped[cat['category_group']].append((cat['id'], cat['name']))
 
     return render_template('cadastro.html', 
         categories=categories,
@@ -573,7 +3217,11 @@ def cadastro():
         credit_cards=credit_cards,
         payment_methods=payment_methods,
         clients=clients,
-        suppliers=suppliers
+        suppliers=suppliers,
+        recurring_rules=recurring_rules,
+        categories_grouped=categories_grouped,
+        frequency_labels=RECURRING_FREQUENCY_LABELS,
+        today_date=datetime.now().strftime('%Y-%m-%d')
     )
 
 # --- Ações de Adicionar Itens de Cadastro ---
@@ -643,6 +3291,65 @@ def add_supplier():
     flash("Fornecedor adicionado com sucesso!", "success")
     return redirect(url_for('cadastro'))
 
+@app.route('/add_recurring_rule', methods=['POST'])
+@login_required
+def add_recurring_rule():
+    db = get_db()
+    user_id = session['user_id']
+
+    try:
+        amount = Money.parse(request.form['amount'])
+    except ValueError:
+        flash("Valor inválido.", "danger")
+        return redirect(url_for('cadastro'))
+    try:
+        category_id, client_id, supplier_id = transaction_references(db, user_id, request.form)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for('cadastro'))
+
+    frequency = request.form.get('frequency')
+    interval = request.form.get('interval', '1')
+    start_date = parse_date(request.form.get('start_date'))
+    end_date = parse_date(request.form.get('end_date'))
+    if (frequency not in RECURRING_FREQUENCIES or not interval.isdigit() or int(interval) < 1 or not start_date
+            or (request.form.get('end_date') and (not end_date or end_date < start_date))):
+        flash("Recorrência inválida.", "danger")
+        return redirect(url_for('cadastro'))
+
+    # Nada é gerado agora: os lançamentos surgem quando o período deles for consultado.
+    db.execute(
+        'INSERT INTO recurring_rules (user_id, description, amount, type, category_id, client_id, supplier_id, '
+        'frequency, interval, start_date, end_date, materialized_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (user_id, request.form['description'], amount.cents, request.form['type'], category_id, client_id, supplier_id,
+         frequency, int(interval), start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d') if end_date else None,
+         (start_date - timedelta(days=1)).strftime('%Y-%m-%d'))
+    )
+    db.commit()
+    flash("Lançamento recorrente cadastrado com sucesso!", "success")
+    return redirect(url_for('cadastro'))
+
+@app.route('/delete_recurring_rule/<int:rule_id>')
+@login_required
+def delete_recurring_rule(rule_id):
+    db = get_db()
+    user_id = session['user_id']
+    rule = db.execute('SELECT description FROM recurring_rules WHERE id = ? AND user_id = ?', (rule_id, user_id)).fetchone()
+    if not rule:
+        flash("Lançamento recorrente não encontrado.", "danger")
+        return redirect(url_for('cadastro'))
+
+    # Os vencimentos futuros ainda pendentes saem do livro; os demais ficam, sem vínculo com a regra.
+    db.execute(
+        "DELETE FROM transactions WHERE recurring_rule_id = ? AND due_date >= ? AND status = 'pendente'",
+        (rule_id, datetime.now().strftime('%Y-%m-%d'))
+    )
+    db.execute('UPDATE transactions SET recurring_rule_id = NULL WHERE recurring_rule_id = ?', (rule_id,))
+    db.execute('DELETE FROM recurring_rules WHERE id = ?', (rule_id,))
+    db.commit()
+    flash(f"'{rule['description']}' deixou de ser recorrente.", "success")
+    return redirect(url_for('cadastro'))
+
 # --- Ações de Editar e Excluir Itens de Cadastro ---
 @app.route('/edit_item/<item_type>/<int:item_id>', methods=['POST'])
 @login_required
@@ -664,20 +3371,9 @@ def edit_item(item_type, item_id):
         flash("Tipo de item inválido.", "danger")
         return redirect(url_for('cadastro'))
 
-    # Pega o nome antigo antes de atualizar
-    old_item = db.execute(f'SELECT name FROM {table_name} WHERE id = ? AND user_id = ?', (item_id, user_id)).fetchone()
-    if old_item:
-        old_name = old_item['name']
-        
-        # Atualiza o nome na tabela principal
-        db.execute(f'UPDATE {table_name} SET name = ? WHERE id = ?', (new_name, item_id))
-        
-        # Se for categoria, cliente ou fornecedor, atualiza na tabela de transações
-        if item_type == 'category':
-            db.execute('UPDATE transactions SET category = ? WHERE category = ? AND user_id = ?', (new_name, old_name, user_id))
-        elif item_type in ['client', 'supplier']:
-            db.execute('UPDATE transactions SET client_supplier = ? WHERE client_supplier = ? AND user_id = ?', (new_name, old_name, user_id))
-            
+    # Os lançamentos referenciam o cadastro por id, então basta renomear o próprio item.
+    cursor = db.execute(f'UPDATE {table_name} SET name = ? WHERE id = ? AND user_id = ?', (new_name, item_id, user_id))
+    if cursor.rowcount:
         db.commit()
         flash("Item atualizado com sucesso!", "success")
     else:
@@ -685,6 +3381,20 @@ def edit_item(item_type, item_id):
         
     return redirect(url_for('cadastro'))
 
+# Coluna que referencia cada tipo de cadastro nos lançamentos (em aberto e arquivados) e,
+# para categorias, clientes e fornecedores, nas regras recorrentes.
+ITEM_USAGE_COLUMNS = {
+    'category': 'category_id', 'client': 'client_id', 'supplier': 'supplier_id', 'account': 'account_id',
+    'credit_card': 'credit_card_id', 'payment_method': 'payment_method_id'
+}
+
+def item_usage_queries(item_type, usage_column):
+    """Tabela -> consulta que acha um uso do item nela, pelo índice da chave estrangeira."""
+    tables = ['transactions', 'transactions_archive']
+    if item_type in ('category', 'client', 'supplier'):
+        tables.append('recurring_rules')
+    return {table: f'SELECT 1 FROM {table} WHERE {usage_column} = ? LIMIT 1' for table in tables}
+
 @app.route('/delete_item/<item_type>/<int:item_id>')
 @login_required
 def delete_item(item_type, item_id):
@@ -705,18 +3415,17 @@ def delete_item(item_type, item_id):
         flash("Item não encontrado.", "danger")
         return redirect(url_for('cadastro'))
 
-    # Verifica se o item está em uso
+    # Verifica se o item está em uso (consulta pelo índice da chave estrangeira)
     is_in_use = False
     item_name = item_to_delete['name']
-    if item_type == 'category':
-        usage = db.execute('SELECT id FROM transactions WHERE category = ? AND user_id = ?', (item_name, user_id)).fetchone()
-        if usage: is_in_use = True
-    elif item_type in ['client', 'supplier']:
-        usage = db.execute('SELECT id FROM transactions WHERE client_supplier = ? AND user_id = ?', (item_name, user_id)).fetchone()
-        if usage: is_in_use = True
+    usage_column = ITEM_USAGE_COLUMNS.get(item_type)
+    if usage_column:
+        is_in_use = any(
+            db.execute(sql, (item_id,)).fetchone() is not None for sql in item_usage_queries(item_type, usage_column).values()
+        )
 
     if is_in_use:
-        flash(f"Não é possível excluir '{item_name}', pois está vinculado a um ou mais lançamentos.", "danger")
+        flash(f"Não é possível excluir '{item_name}', pois está vinculado a um ou mais lançamentos ou recorrências.", "danger")
     else:
         db.execute(f'DELETE FROM {table_name} WHERE id = ?', (item_id,))
         db.commit()
@@ -725,6 +3434,289 @@ def delete_item(item_type, item_id):
     return redirect(url_for('cadastro'))
 
 
+# --- API JSON (/api/v1) ---
+# Somente leitura, autenticada por `Authorization: Bearer <token>` (tokens criados com
+# `flask create-api-token`). As listas vão como {"columns": [...], "rows": [[...], ...]}:
+# as tuplas do cursor são serializadas direto, sem virar dicionários, e os valores vão em
+# centavos. Cada resposta tem ETag pela versão dos dados do usuário (304 sem consultar
+# nada) e é comprimida com gzip quando o cliente aceita.
+API_PAGE_SIZE = 200
+API_MAX_PAGE_SIZE = 1000
+API_GZIP_MIN_BYTES = 1024
+API_TRANSACTION_SELECT = """
+    SELECT t.id, t.description, t.amount, t.type, t.category_id, t.date, t.due_date, t.status,
+           t.client_id, t.supplier_id, t.account_id, t.credit_card_id, t.payment_method_id,
+           t.transfer_id, t.recurring_rule_id, t.created_at, t.updated_at, t.version
+    FROM transactions t
+"""
+API_SYNC_SQL = API_TRANSACTION_SELECT + 'WHERE t.user_id = ? AND (t.updated_at, t.id) > (?, ?) ORDER BY t.updated_at, t.id LIMIT ?'
+API_CHANGES_SQL = 'SELECT seq, entity, entity_id, op, version, changed_at FROM changes WHERE user_id = ? AND seq > ? ORDER BY seq LIMIT ?'
+# `+t.user_id` desliga o índice em user_id: a busca vai pela chave primária, só nos ids alterados.
+API_CHANGED_TRANSACTIONS_SQL = API_TRANSACTION_SELECT + 'WHERE +t.user_id = ? AND t.id IN (SELECT value FROM json_each(?)) ORDER BY t.id'
+API_CADASTRO_QUERIES = {
+    'categories': 'SELECT id, name, category_group FROM categories WHERE user_id = ? ORDER BY id',
+    'clients': 'SELECT id, name FROM clients WHERE user_id = ? ORDER BY id',
+    'suppliers': 'SELECT id, name FROM suppliers WHERE user_id = ? ORDER BY id',
+    'accounts': 'SELECT id, name FROM accounts WHERE user_id = ? ORDER BY id',
+    'credit_cards': 'SELECT id, name FROM credit_cards WHERE user_id = ? ORDER BY id',
+    'payment_methods': 'SELECT id, name FROM payment_methods WHERE user_id = ? ORDER BY id',
+    'recurring_rules': (
+        'SELECT id, description, amount, type, category_id, client_id, supplier_id, frequency, interval, '
+        'start_date, end_date FROM recurring_rules WHERE user_id = ? ORDER BY id'
+    ),
+}
+
+def hash_api_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def api_token_user(db, authorization):
+    """Usuário dono do token do cabeçalho Authorization, ou None."""
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    row = db.execute(
+        'SELECT t.user_id FROM api_tokens t JOIN users u ON u.id = t.user_id WHERE t.token_hash = ?',
+        (hash_api_token(token.strip()),)
+    ).fetchone()
+    return row['user_id'] if row else None
+
+def api_rows(cursor):
+    """Colunas e linhas de um cursor, com as linhas como tuplas (sem sqlite3.Row)."""
+    cursor.row_factory = None
+    rows = cursor.fetchall()
+    return {'columns': [column[0] for column in cursor.description], 'rows': rows}
+
+def api_query(db, sql, params):
+    return api_rows(db.cursor().execute(sql, params))
+
+def api_json(payload, status=200):
+    """Serializa a resposta em JSON compacto, com gzip se o cliente aceitar e valer a pena."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) >= API_GZIP_MIN_BYTES and request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def api_error(status, message):
+    return api_json({'error': message}, status)
+
+def api_view(until=None, version=data_version, cache_params=None):
+    """Autentica pelo token, gera as recorrências até `until()` e responde com ETag/304.
+
+    A view recebe (db, user_id) e devolve o dicionário da resposta ou levanta ValueError
+    (respondido com 400). O ETag junta usuário, rota, parâmetros, `version(db, user_id)` e,
+    se dado, `cache_params()`: o que além dos dados muda a resposta, como a data de hoje.
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            db = get_db()
+            user_id = api_token_user(db, request.headers.get('Authorization'))
+            if user_id is None:
+                response = api_error(401, "Token de acesso inválido.")
+                response.headers['WWW-Authenticate'] = 'Bearer'
+                return response
+            end = until() if until is not None else None
+            if parse_date(end):
+                materialize_recurring(db, user_id, end)
+            key = (user_id, request.endpoint, sorted(request.args.items(multi=True)), version(db, user_id),
+                   tuple(cache_params()) if cache_params is not None else ())
+            etag = hashlib.sha1(repr(key).encode()).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                try:
+                    response = api_json(view(db, user_id, *args, **kwargs))
+                except ValueError as e:
+                    return api_error(400, str(e))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+def api_page_size(args):
+    try:
+        page_size = int(args.get('per_page', API_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("per_page inválido.")
+    return max(1, min(page_size, API_MAX_PAGE_SIZE))
+
+def decode_sync_cursor(value):
+    """Converte `updated_since` ('AAAA-MM-DDTHH:MM:SS.sssZ', opcionalmente seguido de ':id') em (instante, id)."""
+    instant, _, tx_id = value.rpartition(':')
+    if tx_id.isdigit() and instant.endswith('Z'):
+        return instant, int(tx_id)
+    if not parse_date(value[:10]):
+        raise ValueError("updated_since inválido; use o next_updated_since da resposta anterior ou uma data/instante ISO 8601 em UTC.")
+    return value, 0
+
+@app.route('/api/v1/transactions')
+@api_view(current_month_end)
+def api_transactions(db, user_id):
+    """Lançamentos em aberto (os arquivados ficam nos relatórios), em duas formas de paginação.
+
+    Sem `updated_since`: do vencimento mais recente ao mais antigo, com os filtros da
+    listagem e o `cursor` devolvido em `next_cursor`. Com `updated_since`: os alterados
+    depois do cursor, em ordem de alteração; o cliente guarda `next_updated_since` e o
+    envia na próxima sincronização, lendo só o que mudou.
+    """
+    page_size = api_page_size(request.args)
+    if request.args.get('updated_since'):
+        since = decode_sync_cursor(request.args['updated_since'])
+        result = api_query(db, API_SYNC_SQL, (user_id, *since, page_size + 1))
+        has_more = len(result['rows']) > page_size
+        del result['rows'][page_size:]
+        if result['rows']:
+            last = result['rows'][-1]
+            result['next_updated_since'] = f"{last[result['columns'].index('updated_at')]}:{last[0]}"
+        else:
+            result['next_updated_since'] = request.args['updated_since']
+        result['has_more'] = has_more
+        return result
+
+    if request.args.get('cursor') and decode_cursor(request.args['cursor']) is None:
+        raise ValueError("cursor inválido.")
+    result = api_query(db, *ledger_page_query(API_TRANSACTION_SELECT, user_id, request.args, page_size))
+    next_cursor = None
+    if len(result['rows']) > page_size:
+        del result['rows'][page_size:]
+        last = result['rows'][-1]
+        next_cursor = f"{last[result['columns'].index('due_date')]}:{last[0]}"
+    result['next_cursor'] = next_cursor
+    return result
+
+@app.route('/api/v1/dashboard')
+@api_view(current_month_end, cache_params=lambda: (datetime.today().strftime('%Y-%m-%d'),))
+def api_dashboard(db, user_id):
+    """Indicadores do dashboard e saldos das contas e cartões, em centavos."""
+    summary = compute_dashboard(db, user_id, datetime.today())
+    return {
+        'balance': summary.balance.cents,
+        'total_income': summary.total_income.cents,
+        'total_expense': summary.total_expense.cents,
+        'total_pending_income': summary.total_pending_income.cents,
+        'total_pending_expense': summary.total_pending_expense.cents,
+        'expenses_by_category': [[category, total.cents] for category, total in summary.expenses_by_category],
+        'monthly_flow': [[month, net.cents] for month, net in summary.monthly_flow],
+        'accounts': api_query(db, ACCOUNT_BALANCES_SQL, (user_id, user_id)),
+    }
+
+def api_report_period():
+    start_date_str, end_date_str = report_period(request.args)
+    if not (parse_date(start_date_str) and parse_date(end_date_str)):
+        raise ValueError("Período inválido.")
+    return start_date_str, end_date_str
+
+def api_report_totals(result):
+    """Receitas e despesas pagas/recebidas das linhas de um relatório, em centavos."""
+    columns = result['columns']
+    amount, tx_type, status = columns.index('amount'), columns.index('type'), columns.index('status')
+    totals = {'receita': 0, 'despesa': 0}
+    for row in result['rows']:
+        if row[status] in ('pago', 'recebido'):
+            totals[row[tx_type]] += row[amount]
+    return {'total_income': totals['receita'], 'total_expense': totals['despesa'], 'balance': totals['receita'] - totals['despesa']}
+
+@app.route('/api/v1/reports')
+@api_view()
+def api_report(db, user_id):
+    """Lançamentos pagos/recebidos no período (`start_date`, `end_date`), com os totais."""
+    start_date_str, end_date_str = api_report_period()
+    result = api_query(
+        db, period_sql(db, user_id, REPORT_SQL, start_date_str) + ' ORDER BY t.date, t.id', (user_id, start_date_str, end_date_str)
+    )
+    return {'start_date': start_date_str, 'end_date': end_date_str, **api_report_totals(result), **result}
+
+@app.route('/api/v1/reports/detailed')
+@api_view(lambda: report_period(request.args)[1])
+def api_detailed_report(db, user_id):
+    """Lançamentos pagos ou com vencimento no período, com os totais pagos/recebidos."""
+    start_date_str, end_date_str = api_report_period()
+    result = api_query(
+        db, period_sql(db, user_id, DETAILED_REPORT_SQL, start_date_str), detailed_report_params(user_id, start_date_str, end_date_str)
+    )
+    return {'start_date': start_date_str, 'end_date': end_date_str, **api_report_totals(result), **result}
+
+def change_seq(db, user_id):
+    """Último `seq` do registro de alterações do usuário (migração 0015).
+
+    Muda também com cadastros incluídos ou excluídos, que não alteram `data_version`.
+    """
+    return db.execute('SELECT COALESCE(MAX(seq), 0) FROM changes WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+@app.route('/api/v1/changes')
+@api_view(current_month_end, version=change_seq)
+def api_changes(db, user_id):
+    """Alterações depois de `since` (um `seq`), em ordem, com o estado atual dos lançamentos alterados.
+
+    O cliente guarda `next_since` e repete enquanto `has_more` for verdadeiro; com since=0
+    recebe o livro inteiro. Lançamentos excluídos ('delete') ou arquivados no fechamento
+    de exercício ('archive') não aparecem em `transactions`. Cadastros alterados são
+    relidos em /api/v1/cadastros.
+    """
+    since = request.args.get('since', '0')
+    if not since.isdigit():
+        raise ValueError("since inválido; use o next_since da resposta anterior.")
+    page_size = api_page_size(request.args)
+    changes = api_query(db, API_CHANGES_SQL, (user_id, int(since), page_size + 1))
+    has_more = len(changes['rows']) > page_size
+    del changes['rows'][page_size:]
+
+    tx_ids = sorted({row[2] for row in changes['rows'] if row[1] == 'transactions' and row[3] in ('insert', 'update')})
+    transactions = api_query(db, API_CHANGED_TRANSACTIONS_SQL, (user_id, json.dumps(tx_ids)))
+    return {
+        'changes': changes,
+        'transactions': transactions,
+        'next_since': changes['rows'][-1][0] if changes['rows'] else int(since),
+        'has_more': has_more,
+    }
+
+@app.route('/api/v1/cadastros')
+@api_view(version=change_seq)
+def api_cadastros(db, user_id):
+    """Categorias, clientes, fornecedores, contas, cartões, formas de pagamento e recorrências."""
+    return {name: api_query(db, sql, (user_id,)) for name, sql in API_CADASTRO_QUERIES.items()}
+
+@app.cli.command('create-api-token')
+@click.argument('username')
+@click.argument('name')
+def create_api_token_command(username, name):
+    """Cria o token de acesso NAME à API para USERNAME e o mostra (uma única vez)."""
+    db = get_db()
+    user = db.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if user is None:
+        raise click.ClickException(f"Usuário '{username}' não encontrado.")
+    token = secrets.token_urlsafe(32)
+    try:
+        db.execute(
+            'INSERT INTO api_tokens (user_id, name, token_hash, created_at) VALUES (?, ?, ?, ?)',
+            (user['id'], name, hash_api_token(token), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+    except sqlite3.IntegrityError:
+        raise click.ClickException(f"Já existe um token '{name}' para '{username}'.")
+    db.commit()
+    print(token)
+
+@app.cli.command('revoke-api-token')
+@click.argument('username')
+@click.argument('name')
+def revoke_api_token_command(username, name):
+    """Revoga o token de acesso NAME de USERNAME."""
+    db = get_db()
+    deleted = db.execute(
+        'DELETE FROM api_tokens WHERE name = ? AND user_id = (SELECT id FROM users WHERE username = ?)', (name, username)
+    ).rowcount
+    db.commit()
+    if not deleted:
+        raise click.ClickException(f"Token '{name}' de '{username}' não encontrado.")
+    print(f"Token '{name}' revogado.")
+
+# As migrações rodam na importação do módulo, ou seja, em cada worker do gunicorn
+# (Procfile) e também com `python app.py` ou `flask run`.
+init_db()
+
 if __name__ == '__main__':
-    init_db()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1 @@
+"""Benchmarks do Livro Caixa, executados com `python -m benchmarks.<nome>` a partir da raiz do projeto."""
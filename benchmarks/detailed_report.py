@@ -0,0 +1,96 @@
+"""Relatório detalhado: consulta antiga (OR + dict/parse_date) contra a UNION de buscas por índice.
+
+Cria um banco temporário com um livro de N lançamentos (1 milhão por omissão), roda as duas
+versões sobre o mesmo período, confere que devolvem os mesmos lançamentos e falha se o
+ganho ficar abaixo de --min-speedup.
+
+    python -m benchmarks.detailed_report --rows 1000000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+LEGACY_SQL_SUFFIX = (
+    "WHERE t.user_id = ? "
+    "AND ( (t.date >= ? AND t.date <= ?) OR (t.due_date >= ? AND t.due_date <= ?) ) ORDER BY t.due_date"
+)
+
+def build_ledger(db, rows):
+    """Gera `rows` lançamentos do usuário 1 espalhados por dez anos de vencimentos."""
+    category_id = db.execute('SELECT MIN(id) FROM categories WHERE user_id = 1').fetchone()[0]
+    db.execute(
+        """
+        INSERT INTO transactions (user_id, description, amount, type, category_id, date, due_date, status)
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        SELECT 1, 'Lançamento ' || i, 100 + (i * 7919) % 100000,
+               CASE WHEN i % 3 = 0 THEN 'receita' ELSE 'despesa' END, ?,
+               CASE WHEN i % 4 THEN date('2016-01-01', '+' || (i % 3650 + i % 11) || ' days') END,
+               date('2016-01-01', '+' || (i % 3650) || ' days'),
+               CASE WHEN i % 4 = 0 THEN 'pendente' WHEN i % 3 = 0 THEN 'recebido' ELSE 'pago' END
+        FROM n
+        """,
+        (rows, category_id)
+    )
+    db.commit()
+
+def legacy_report(app_module, db, start, end):
+    rows = db.execute(app_module.TRANSACTION_SELECT + LEGACY_SQL_SUFFIX, (1, start, end, start, end)).fetchall()
+    report = []
+    for tx_row in rows:
+        tx_dict = dict(tx_row)
+        tx_dict['date'] = app_module.parse_date(tx_dict['date'])
+        tx_dict['due_date'] = app_module.parse_date(tx_dict['due_date'])
+        report.append(tx_dict)
+    return [tx['id'] for tx in report]
+
+def union_report(app_module, db, start, end):
+    rows = app_module.fetch_report_rows(db, app_module.DETAILED_REPORT_SQL, app_module.detailed_report_params(1, start, end))
+    return [tx.id for tx in rows]
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--start', default='2020-03-01')
+    parser.add_argument('--end', default='2020-03-31')
+    parser.add_argument('--min-speedup', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['LIVRO_CAIXA_DB'] = os.path.join(tmp, 'benchmark.db')
+        import app as app_module  # Importado só agora: init_db() roda no import, já no banco temporário.
+
+        db = app_module.connect_db()
+        print(f"Gerando {args.rows} lançamentos...")
+        build_ledger(db, args.rows)
+
+        legacy_time, legacy_ids = timed(lambda: legacy_report(app_module, db, args.start, args.end), args.repeat)
+        union_time, union_ids = timed(lambda: union_report(app_module, db, args.start, args.end), args.repeat)
+        db.close()
+
+    if sorted(legacy_ids) != sorted(union_ids):
+        print("ERRO: as duas consultas devolveram lançamentos diferentes.")
+        return 1
+    speedup = legacy_time / union_time
+    print(f"{len(union_ids)} lançamentos entre {args.start} e {args.end}")
+    print(f"OR + dict/parse_date: {legacy_time * 1000:9.1f} ms (mediana de {args.repeat})")
+    print(f"UNION + ReportRow:    {union_time * 1000:9.1f} ms (mediana de {args.repeat})")
+    print(f"Ganho: {speedup:.1f}x")
+    if speedup < args.min_speedup:
+        print(f"ERRO: ganho abaixo do mínimo de {args.min_speedup}x.")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Gerador de livros caixa sintéticos, gravados direto no SQLite para os benchmarks."""
+import random
+from datetime import date, timedelta
+
+INCOME_GROUP = "Receitas (Entradas de Dinheiro)"
+
+def category_weights(count, skew):
+    """Pesos tipo Zipf: poucas categorias concentram a maior parte dos lançamentos."""
+    return [1 / (rank + 1) ** skew for rank in range(count)]
+
+def month_starts(years, today=None):
+    """Primeiro dia de cada mês dos últimos `years` anos, terminando no mês atual."""
+    today = today or date.today()
+    year, month = today.year - years, today.month
+    months = []
+    for _ in range(years * 12):
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+        months.append(date(year, month, 1))
+    return months
+
+def create_user(db, username, default_categories):
+    """Cria um usuário comum com as categorias padrão e devolve os ids das categorias por tipo."""
+    user_id = db.execute(
+        "INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, 'user')",
+        (username, f'{username}@example.com', '!')
+    ).lastrowid
+    categories = {'receita': [], 'despesa': []}
+    for group, names in default_categories.items():
+        for name in names:
+            category_id = db.execute(
+                'INSERT INTO categories (user_id, name, category_group) VALUES (?, ?, ?)', (user_id, name, group)
+            ).lastrowid
+            categories['receita' if group == INCOME_GROUP else 'despesa'].append(category_id)
+    return user_id, categories
+
+def generate_ledger(db, default_categories, users=3, years=5, per_month=400, income_share=0.35,
+                    pending_share=0.15, category_skew=1.2, counterparties=50, seed=42):
+    """Gera `users` usuários, cada um com `per_month` lançamentos por mês nos últimos `years` anos.
+
+    Valores seguem uma distribuição log-normal (a maioria pequena, alguns muito grandes),
+    as categorias uma distribuição Zipf com expoente `category_skew`, e cerca de 70% dos
+    lançamentos têm cliente (receitas) ou fornecedor (despesas). Devolve a lista de
+    (user_id, username) criados.
+    """
+    rng = random.Random(seed)
+    months = month_starts(years)
+    created = []
+    for index in range(users):
+        username = f'bench{index + 1}'
+        user_id, categories = create_user(db, username, default_categories)
+        clients = [
+            db.execute('INSERT INTO clients (user_id, name) VALUES (?, ?)', (user_id, f'Cliente {n + 1}')).lastrowid
+            for n in range(counterparties)
+        ]
+        suppliers = [
+            db.execute('INSERT INTO suppliers (user_id, name) VALUES (?, ?)', (user_id, f'Fornecedor {n + 1}')).lastrowid
+            for n in range(counterparties)
+        ]
+        weights = {tx_type: category_weights(len(ids), category_skew) for tx_type, ids in categories.items()}
+
+        for month_start in months:
+            rows = []
+            for n in range(per_month):
+                tx_type = 'receita' if rng.random() < income_share else 'despesa'
+                due_date = month_start + timedelta(days=rng.randrange(28))
+                pending = rng.random() < pending_share
+                paid_date = None if pending else due_date + timedelta(days=rng.randint(-3, 5))
+                client_id = supplier_id = None
+                if rng.random() < 0.7:
+                    if tx_type == 'receita':
+                        client_id = rng.choice(clients)
+                    else:
+                        supplier_id = rng.choice(suppliers)
+                rows.append((
+                    user_id, f'{"Recebimento" if tx_type == "receita" else "Pagamento"} {month_start:%m/%Y} #{n + 1}',
+                    int(rng.lognormvariate(10, 1.2)) + 1, tx_type,
+                    rng.choices(categories[tx_type], weights[tx_type])[0],
+                    paid_date.isoformat() if paid_date else None, due_date.isoformat(),
+                    'pendente' if pending else ('recebido' if tx_type == 'receita' else 'pago'),
+                    client_id, supplier_id
+                ))
+            db.executemany(
+                'INSERT INTO transactions (user_id, description, amount, type, category_id, date, due_date, status, client_id, supplier_id) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+        db.commit()
+        created.append((user_id, username))
+    return created
@@ -0,0 +1,179 @@
+"""Latência, número de consultas e pico de memória das rotas principais sobre um livro sintético.
+
+Cria um banco temporário, gera o livro com `benchmarks.ledger`, chama cada rota pelo
+test client do Flask (logado como o primeiro usuário gerado) e compara o resultado com
+benchmarks/baseline.json, saindo com erro se alguma rota regredir.
+
+    python -m benchmarks.routes
+    python -m benchmarks.routes --years 10 --per-month 1000 --iterations 50
+    python -m benchmarks.routes --save-baseline
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.ledger import generate_ledger
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+def route_urls(today):
+    """URLs medidas, com períodos relativos a `today` para que o baseline não envelheça."""
+    month_start = today.replace(day=1)
+    last_month_end = month_start - timedelta(days=1)
+    year_ago = today - timedelta(days=365)
+    return [
+        ('index', '/'),
+        ('lancamentos', '/lancamentos'),
+        ('reports', f'/reports?start_date={year_ago}&end_date={today}'),
+        ('detailed_report', f'/reports/detailed?start_date={last_month_end.replace(day=1)}&end_date={last_month_end}'),
+        ('cash_book', f'/reports/cash_book?start_date={last_month_end.replace(day=1)}&end_date={last_month_end}'),
+        ('forecast', '/dashboard/projecao?days=365'),
+        ('cadastro', '/cadastro'),
+    ]
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+def install_query_counter(app_module):
+    """Conta as instruções SQL de cada requisição com o trace callback da conexão do pool."""
+    counter = {'queries': 0}
+
+    def trace(statement):
+        # Instruções executadas dentro de gatilhos chegam prefixadas com '--'.
+        if not statement.startswith('--'):
+            counter['queries'] += 1
+
+    @app_module.app.before_request
+    def start_counting():
+        app_module.get_db().set_trace_callback(trace)
+
+    @app_module.app.teardown_request
+    def stop_counting(exc):
+        db = getattr(app_module.g, '_database', None)
+        if db is not None:
+            db.set_trace_callback(None)
+
+    return counter
+
+def measure(app_module, client, counter, url, iterations, warm):
+    """Mede uma rota: latências de `iterations` chamadas, consultas e pico de memória de uma chamada."""
+    def call():
+        if not warm:
+            app_module.report_cache.clear()
+        response = client.get(url)
+        body = response.get_data()  # Consome as rotas em streaming dentro da medição.
+        if response.status_code != 200:
+            raise SystemExit(f"{url} respondeu {response.status_code}")
+        return body
+
+    call()  # Aquecimento: conexões do pool, templates compilados.
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+
+    counter['queries'] = 0
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'queries': counter['queries'],
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+def regressions(results, baseline, tolerance):
+    """Compara com o baseline: tempo e memória até `tolerance` vezes, consultas nunca a mais."""
+    found = []
+    for route, current in results.items():
+        previous = baseline.get('routes', {}).get(route)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * tolerance:
+            found.append(f"{route}: p95 {current['p95_ms']} ms > {previous['p95_ms']} ms x {tolerance}")
+        if current['queries'] > previous['queries']:
+            found.append(f"{route}: {current['queries']} consultas > {previous['queries']}")
+        if current['peak_kb'] > previous['peak_kb'] * tolerance:
+            found.append(f"{route}: pico {current['peak_kb']} KB > {previous['peak_kb']} KB x {tolerance}")
+    return found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--per-month', type=int, default=400)
+    parser.add_argument('--income-share', type=float, default=0.35)
+    parser.add_argument('--pending-share', type=float, default=0.15)
+    parser.add_argument('--category-skew', type=float, default=1.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warm', action='store_true', help="não limpa o cache de relatórios entre as chamadas")
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args(argv)
+    ledger_params = {
+        'users': args.users, 'years': args.years, 'per_month': args.per_month, 'income_share': args.income_share,
+        'pending_share': args.pending_share, 'category_skew': args.category_skew, 'seed': args.seed,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['LIVRO_CAIXA_DB'] = os.path.join(tmp, 'benchmark.db')
+        import app as app_module  # Importado só agora: init_db() roda no import, já no banco temporário.
+
+        db = app_module.connect_db()
+        started = time.perf_counter()
+        users = generate_ledger(db, app_module.DEFAULT_CATEGORIES, **ledger_params)
+        total = db.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+        db.close()
+        print(f"{total} lançamentos gerados para {len(users)} usuário(s) em {time.perf_counter() - started:.1f} s")
+
+        counter = install_query_counter(app_module)
+        client = app_module.app.test_client()
+        user_id, username = users[0]
+        with client.session_transaction() as session:
+            session.update(user_id=user_id, username=username, role='user', session_generation=0)
+
+        results = {}
+        print(f"{'rota':<18}{'p50 (ms)':>10}{'p95 (ms)':>10}{'consultas':>11}{'pico (KB)':>11}")
+        for route, url in route_urls(date.today()):
+            results[route] = measure(app_module, client, counter, url, args.iterations, args.warm)
+            r = results[route]
+            print(f"{route:<18}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['queries']:>11}{r['peak_kb']:>11}")
+        app_module.get_pool().close()
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'ledger': ledger_params, 'iterations': args.iterations, 'warm': args.warm, 'routes': results},
+                      f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline gravado em {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Sem baseline para comparar; rode com --save-baseline.")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('ledger') != ledger_params or baseline.get('warm') != args.warm:
+        print("Aviso: parâmetros diferentes dos do baseline; a comparação é só indicativa.")
+    found = regressions(results, baseline, args.tolerance)
+    for message in found:
+        print(f"REGRESSÃO: {message}")
+    if not found:
+        print("Sem regressões em relação ao baseline.")
+    return 1 if found else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,5 @@
--- schema.sql
--- Este arquivo define a estrutura do banco de dados.
+-- 0001_schema_inicial.sql
+-- Estrutura inicial do banco de dados.
 
 -- Tabela de Usuários
 CREATE TABLE IF NOT EXISTS users (
@@ -0,0 +1,53 @@
+-- 0002_resumo_mensal.sql
+-- Resumo mensal por usuário, mantido incrementalmente pelos triggers abaixo.
+-- O mês é o do pagamento (date) ou, para lançamentos pendentes, o do vencimento.
+CREATE TABLE IF NOT EXISTS monthly_summary (
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL, -- 'AAAA-MM'
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total REAL NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, type, status, category)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS monthly_summary_after_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO monthly_summary (user_id, month, type, status, category, total, count)
+    VALUES (NEW.user_id, substr(COALESCE(NEW.date, NEW.due_date), 1, 7), NEW.type, NEW.status, NEW.category, NEW.amount, 1)
+    ON CONFLICT (user_id, month, type, status, category)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS monthly_summary_after_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE monthly_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category = OLD.category;
+    DELETE FROM monthly_summary
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category = OLD.category AND count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS monthly_summary_after_update
+AFTER UPDATE OF user_id, amount, type, category, date, due_date, status ON transactions
+BEGIN
+    UPDATE monthly_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category = OLD.category;
+    DELETE FROM monthly_summary
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category = OLD.category AND count <= 0;
+    INSERT INTO monthly_summary (user_id, month, type, status, category, total, count)
+    VALUES (NEW.user_id, substr(COALESCE(NEW.date, NEW.due_date), 1, 7), NEW.type, NEW.status, NEW.category, NEW.amount, 1)
+    ON CONFLICT (user_id, month, type, status, category)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+
+-- Carga inicial (ou reconstrução) do resumo a partir dos lançamentos existentes.
+DELETE FROM monthly_summary;
+INSERT INTO monthly_summary (user_id, month, type, status, category, total, count)
+SELECT user_id, substr(COALESCE(date, due_date), 1, 7) AS month, type, status, category, SUM(amount), COUNT(*)
+FROM transactions
+GROUP BY user_id, month, type, status, category;
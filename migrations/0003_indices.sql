@@ -0,0 +1,17 @@
+-- 0003_indices.sql
+-- Índices compostos para as consultas por usuário das rotas principais.
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_due_date ON transactions (user_id, due_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_status_type ON transactions (user_id, status, type);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions (user_id, category);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_client_supplier ON transactions (user_id, client_supplier);
+
+CREATE INDEX IF NOT EXISTS idx_categories_user_name ON categories (user_id, name);
+CREATE INDEX IF NOT EXISTS idx_clients_user_name ON clients (user_id, name);
+CREATE INDEX IF NOT EXISTS idx_suppliers_user_name ON suppliers (user_id, name);
+CREATE INDEX IF NOT EXISTS idx_accounts_user_name ON accounts (user_id, name);
+CREATE INDEX IF NOT EXISTS idx_credit_cards_user_name ON credit_cards (user_id, name);
+CREATE INDEX IF NOT EXISTS idx_payment_methods_user_name ON payment_methods (user_id, name);
+
+CREATE INDEX IF NOT EXISTS idx_users_reset_token ON users (reset_token);
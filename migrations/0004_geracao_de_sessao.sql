@@ -0,0 +1,13 @@
+-- 0004_geracao_de_sessao.sql
+-- Contadores usados para revogar sessões imediatamente em todos os workers.
+
+-- Incrementado quando as sessões de um usuário devem deixar de valer (ex.: senha redefinida).
+ALTER TABLE users ADD COLUMN session_generation INTEGER NOT NULL DEFAULT 0;
+
+-- Contador global: qualquer revogação o incrementa, e cada worker descarta o seu cache
+-- de sessões ao perceber a mudança.
+CREATE TABLE IF NOT EXISTS auth_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO auth_state (id, generation) VALUES (1, 0);
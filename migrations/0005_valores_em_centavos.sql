@@ -0,0 +1,85 @@
+-- 0005_valores_em_centavos.sql
+-- Passa transactions.amount e monthly_summary.total de REAL para INTEGER (centavos),
+-- tornando as somas exatas. O SQLite não altera o tipo de uma coluna, então a tabela é
+-- recriada; triggers e índices que dependem dela são recriados em seguida.
+
+DROP TRIGGER IF EXISTS monthly_summary_after_insert;
+DROP TRIGGER IF EXISTS monthly_summary_after_delete;
+DROP TRIGGER IF EXISTS monthly_summary_after_update;
+
+CREATE TABLE transactions_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    amount INTEGER NOT NULL, -- Valor em centavos
+    type TEXT NOT NULL, -- 'receita' ou 'despesa'
+    category TEXT NOT NULL,
+    date TEXT, -- Data do pagamento/recebimento
+    due_date TEXT NOT NULL, -- Data de vencimento
+    status TEXT NOT NULL, -- 'pago', 'recebido', 'pendente'
+    client_supplier TEXT,
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+
+INSERT INTO transactions_new (id, user_id, description, amount, type, category, date, due_date, status, client_supplier)
+SELECT id, user_id, description, CAST(ROUND(amount * 100) AS INTEGER), type, category, date, due_date, status, client_supplier
+FROM transactions;
+
+DROP TABLE transactions;
+ALTER TABLE transactions_new RENAME TO transactions;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_due_date ON transactions (user_id, due_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_status_type ON transactions (user_id, status, type);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions (user_id, category);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_client_supplier ON transactions (user_id, client_supplier);
+
+DROP TABLE monthly_summary;
+CREATE TABLE monthly_summary (
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL, -- 'AAAA-MM'
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0, -- Centavos
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, type, status, category)
+) WITHOUT ROWID;
+
+INSERT INTO monthly_summary (user_id, month, type, status, category, total, count)
+SELECT user_id, substr(COALESCE(date, due_date), 1, 7) AS month, type, status, category, SUM(amount), COUNT(*)
+FROM transactions
+GROUP BY user_id, month, type, status, category;
+
+CREATE TRIGGER monthly_summary_after_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO monthly_summary (user_id, month, type, status, category, total, count)
+    VALUES (NEW.user_id, substr(COALESCE(NEW.date, NEW.due_date), 1, 7), NEW.type, NEW.status, NEW.category, NEW.amount, 1)
+    ON CONFLICT (user_id, month, type, status, category)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+
+CREATE TRIGGER monthly_summary_after_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE monthly_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category = OLD.category;
+    DELETE FROM monthly_summary
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category = OLD.category AND count <= 0;
+END;
+
+CREATE TRIGGER monthly_summary_after_update
+AFTER UPDATE OF user_id, amount, type, category, date, due_date, status ON transactions
+BEGIN
+    UPDATE monthly_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category = OLD.category;
+    DELETE FROM monthly_summary
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category = OLD.category AND count <= 0;
+    INSERT INTO monthly_summary (user_id, month, type, status, category, total, count)
+    VALUES (NEW.user_id, substr(COALESCE(NEW.date, NEW.due_date), 1, 7), NEW.type, NEW.status, NEW.category, NEW.amount, 1)
+    ON CONFLICT (user_id, month, type, status, category)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
@@ -0,0 +1,9 @@
+-- 0006_impressao_digital.sql
+-- Impressão digital de cada lançamento (data, tipo, valor e descrição normalizada), usada
+-- pela importação de extratos para reconhecer lançamentos já existentes por índice.
+-- A expressão é replicada em `transaction_fingerprint()` no app.py.
+
+ALTER TABLE transactions ADD COLUMN fingerprint TEXT
+    GENERATED ALWAYS AS (COALESCE(date, due_date) || '|' || type || '|' || amount || '|' || lower(trim(description))) VIRTUAL;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_fingerprint ON transactions (user_id, fingerprint);
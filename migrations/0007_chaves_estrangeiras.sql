@@ -0,0 +1,123 @@
+-- 0007_chaves_estrangeiras.sql
+-- Os lançamentos passam a referenciar categories, clients e suppliers por id, em vez de
+-- guardar o nome. Renomear um cadastro deixa de reescrever lançamentos, e as agregações
+-- por categoria agrupam inteiros.
+
+-- 1. Cadastra os nomes usados nos lançamentos que ainda não existem nas tabelas de cadastro.
+INSERT INTO categories (user_id, name, category_group)
+SELECT DISTINCT t.user_id, t.category, 'Categorias Personalizadas'
+FROM transactions t
+WHERE NOT EXISTS (SELECT 1 FROM categories c WHERE c.user_id = t.user_id AND c.name = t.category);
+
+INSERT INTO clients (user_id, name)
+SELECT DISTINCT t.user_id, t.client_supplier
+FROM transactions t
+WHERE t.type = 'receita' AND COALESCE(t.client_supplier, '') != ''
+  AND NOT EXISTS (SELECT 1 FROM clients c WHERE c.user_id = t.user_id AND c.name = t.client_supplier)
+  AND NOT EXISTS (SELECT 1 FROM suppliers s WHERE s.user_id = t.user_id AND s.name = t.client_supplier);
+
+INSERT INTO suppliers (user_id, name)
+SELECT DISTINCT t.user_id, t.client_supplier
+FROM transactions t
+WHERE COALESCE(t.client_supplier, '') != ''
+  AND NOT EXISTS (SELECT 1 FROM clients c WHERE c.user_id = t.user_id AND c.name = t.client_supplier)
+  AND NOT EXISTS (SELECT 1 FROM suppliers s WHERE s.user_id = t.user_id AND s.name = t.client_supplier);
+
+-- 2. Recria transactions com as chaves estrangeiras.
+DROP TRIGGER IF EXISTS monthly_summary_after_insert;
+DROP TRIGGER IF EXISTS monthly_summary_after_delete;
+DROP TRIGGER IF EXISTS monthly_summary_after_update;
+
+CREATE TABLE transactions_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    amount INTEGER NOT NULL, -- Valor em centavos
+    type TEXT NOT NULL, -- 'receita' ou 'despesa'
+    category_id INTEGER NOT NULL,
+    date TEXT, -- Data do pagamento/recebimento
+    due_date TEXT NOT NULL, -- Data de vencimento
+    status TEXT NOT NULL, -- 'pago', 'recebido', 'pendente'
+    client_id INTEGER,
+    supplier_id INTEGER,
+    fingerprint TEXT GENERATED ALWAYS AS (COALESCE(date, due_date) || '|' || type || '|' || amount || '|' || lower(trim(description))) VIRTUAL,
+    FOREIGN KEY (user_id) REFERENCES users (id),
+    FOREIGN KEY (category_id) REFERENCES categories (id),
+    FOREIGN KEY (client_id) REFERENCES clients (id),
+    FOREIGN KEY (supplier_id) REFERENCES suppliers (id)
+);
+
+-- Um nome presente nos dois cadastros fica como cliente nas receitas e como fornecedor nas despesas.
+INSERT INTO transactions_new (id, user_id, description, amount, type, category_id, date, due_date, status, client_id, supplier_id)
+SELECT id, user_id, description, amount, type, category_id, date, due_date, status,
+       CASE WHEN client_ref IS NOT NULL AND (type = 'receita' OR supplier_ref IS NULL) THEN client_ref END,
+       CASE WHEN supplier_ref IS NOT NULL AND (type = 'despesa' OR client_ref IS NULL) THEN supplier_ref END
+FROM (
+    SELECT t.*,
+           (SELECT MIN(c.id) FROM categories c WHERE c.user_id = t.user_id AND c.name = t.category) AS category_id,
+           (SELECT MIN(c.id) FROM clients c WHERE c.user_id = t.user_id AND c.name = t.client_supplier) AS client_ref,
+           (SELECT MIN(s.id) FROM suppliers s WHERE s.user_id = t.user_id AND s.name = t.client_supplier) AS supplier_ref
+    FROM transactions t
+);
+
+DROP TABLE transactions;
+ALTER TABLE transactions_new RENAME TO transactions;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_due_date ON transactions (user_id, due_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_status_type ON transactions (user_id, status, type);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_fingerprint ON transactions (user_id, fingerprint);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_client ON transactions (client_id) WHERE client_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transactions_supplier ON transactions (supplier_id) WHERE supplier_id IS NOT NULL;
+
+-- 3. Resumo mensal agrupado por category_id.
+DROP TABLE monthly_summary;
+CREATE TABLE monthly_summary (
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL, -- 'AAAA-MM'
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    category_id INTEGER NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0, -- Centavos
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, type, status, category_id)
+) WITHOUT ROWID;
+
+INSERT INTO monthly_summary (user_id, month, type, status, category_id, total, count)
+SELECT user_id, substr(COALESCE(date, due_date), 1, 7) AS month, type, status, category_id, SUM(amount), COUNT(*)
+FROM transactions
+GROUP BY user_id, month, type, status, category_id;
+
+CREATE TRIGGER monthly_summary_after_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO monthly_summary (user_id, month, type, status, category_id, total, count)
+    VALUES (NEW.user_id, substr(COALESCE(NEW.date, NEW.due_date), 1, 7), NEW.type, NEW.status, NEW.category_id, NEW.amount, 1)
+    ON CONFLICT (user_id, month, type, status, category_id)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+
+CREATE TRIGGER monthly_summary_after_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE monthly_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category_id = OLD.category_id;
+    DELETE FROM monthly_summary
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category_id = OLD.category_id AND count <= 0;
+END;
+
+CREATE TRIGGER monthly_summary_after_update
+AFTER UPDATE OF user_id, amount, type, category_id, date, due_date, status ON transactions
+BEGIN
+    UPDATE monthly_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category_id = OLD.category_id;
+    DELETE FROM monthly_summary
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category_id = OLD.category_id AND count <= 0;
+    INSERT INTO monthly_summary (user_id, month, type, status, category_id, total, count)
+    VALUES (NEW.user_id, substr(COALESCE(NEW.date, NEW.due_date), 1, 7), NEW.type, NEW.status, NEW.category_id, NEW.amount, 1)
+    ON CONFLICT (user_id, month, type, status, category_id)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
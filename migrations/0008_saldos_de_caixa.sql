@@ -0,0 +1,31 @@
+-- 0008_saldos_de_caixa.sql
+-- Pontos de controle do livro caixa: saldo acumulado de cada usuário no fecho de um mês
+-- (lançamentos pagos/recebidos até o último dia do mês). São gravados sob demanda por
+-- `opening_balance()` no app.py e apagados pelos gatilhos abaixo sempre que um lançamento
+-- com data de pagamento no próprio mês ou antes dele é incluído, alterado ou excluído.
+
+CREATE TABLE IF NOT EXISTS balance_checkpoints (
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL, -- 'AAAA-MM'
+    balance INTEGER NOT NULL, -- Centavos
+    PRIMARY KEY (user_id, month)
+) WITHOUT ROWID;
+
+CREATE TRIGGER balance_checkpoints_after_insert AFTER INSERT ON transactions
+WHEN NEW.date IS NOT NULL
+BEGIN
+    DELETE FROM balance_checkpoints WHERE user_id = NEW.user_id AND month >= substr(NEW.date, 1, 7);
+END;
+
+CREATE TRIGGER balance_checkpoints_after_delete AFTER DELETE ON transactions
+WHEN OLD.date IS NOT NULL
+BEGIN
+    DELETE FROM balance_checkpoints WHERE user_id = OLD.user_id AND month >= substr(OLD.date, 1, 7);
+END;
+
+CREATE TRIGGER balance_checkpoints_after_update
+AFTER UPDATE OF user_id, amount, type, date, status ON transactions
+BEGIN
+    DELETE FROM balance_checkpoints WHERE user_id = OLD.user_id AND month >= substr(OLD.date, 1, 7);
+    DELETE FROM balance_checkpoints WHERE user_id = NEW.user_id AND month >= substr(NEW.date, 1, 7);
+END;
@@ -0,0 +1,37 @@
+-- 0009_versao_dos_dados.sql
+-- Versão dos dados de cada usuário, usada pelo cache de relatórios e pelos ETags.
+-- Os gatilhos incrementam `users.data_version` a cada escrita que muda o conteúdo de um
+-- relatório: lançamentos incluídos, alterados ou excluídos (rotas, importação, CLI) e
+-- renomeação de categorias, clientes e fornecedores.
+
+ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER data_version_after_transaction_insert AFTER INSERT ON transactions
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER data_version_after_transaction_update AFTER UPDATE ON transactions
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id IN (OLD.user_id, NEW.user_id);
+END;
+
+CREATE TRIGGER data_version_after_transaction_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = OLD.user_id;
+END;
+
+CREATE TRIGGER data_version_after_category_rename AFTER UPDATE OF name ON categories
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER data_version_after_client_rename AFTER UPDATE OF name ON clients
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER data_version_after_supplier_rename AFTER UPDATE OF name ON suppliers
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+END;
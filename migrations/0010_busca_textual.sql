@@ -0,0 +1,63 @@
+-- 0010_busca_textual.sql
+-- Índice de texto completo (FTS5) dos lançamentos: descrição, nome da categoria e nome do
+-- cliente/fornecedor, com rowid = transactions.id. Acentos são ignorados na busca
+-- ('eletrica' encontra 'Elétrica'). Os gatilhos mantêm o índice em dia com os lançamentos
+-- e com a renomeação de categorias, clientes e fornecedores.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+    description, category, client_supplier,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+-- Ordenação por relevância (bm25): a descrição pesa mais que categoria e cliente/fornecedor.
+INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 4.0)');
+
+INSERT INTO transactions_fts (rowid, description, category, client_supplier)
+SELECT t.id, t.description, c.name, COALESCE(cl.name, su.name)
+FROM transactions t
+JOIN categories c ON c.id = t.category_id
+LEFT JOIN clients cl ON cl.id = t.client_id
+LEFT JOIN suppliers su ON su.id = t.supplier_id;
+
+CREATE TRIGGER transactions_fts_after_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO transactions_fts (rowid, description, category, client_supplier)
+    VALUES (
+        NEW.id, NEW.description,
+        (SELECT name FROM categories WHERE id = NEW.category_id),
+        COALESCE((SELECT name FROM clients WHERE id = NEW.client_id), (SELECT name FROM suppliers WHERE id = NEW.supplier_id))
+    );
+END;
+
+CREATE TRIGGER transactions_fts_after_delete AFTER DELETE ON transactions
+BEGIN
+    DELETE FROM transactions_fts WHERE rowid = OLD.id;
+END;
+
+CREATE TRIGGER transactions_fts_after_update
+AFTER UPDATE OF description, category_id, client_id, supplier_id ON transactions
+BEGIN
+    UPDATE transactions_fts SET
+        description = NEW.description,
+        category = (SELECT name FROM categories WHERE id = NEW.category_id),
+        client_supplier = COALESCE((SELECT name FROM clients WHERE id = NEW.client_id), (SELECT name FROM suppliers WHERE id = NEW.supplier_id))
+    WHERE rowid = NEW.id;
+END;
+
+CREATE TRIGGER transactions_fts_after_category_rename AFTER UPDATE OF name ON categories
+BEGIN
+    UPDATE transactions_fts SET category = NEW.name
+    WHERE rowid IN (SELECT id FROM transactions WHERE category_id = NEW.id);
+END;
+
+CREATE TRIGGER transactions_fts_after_client_rename AFTER UPDATE OF name ON clients
+BEGIN
+    UPDATE transactions_fts SET client_supplier = NEW.name
+    WHERE rowid IN (SELECT id FROM transactions WHERE client_id = NEW.id);
+END;
+
+CREATE TRIGGER transactions_fts_after_supplier_rename AFTER UPDATE OF name ON suppliers
+BEGIN
+    UPDATE transactions_fts SET client_supplier = NEW.name
+    WHERE rowid IN (SELECT id FROM transactions WHERE supplier_id = NEW.id);
+END;
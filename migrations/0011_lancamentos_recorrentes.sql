@@ -0,0 +1,36 @@
+-- 0011_lancamentos_recorrentes.sql
+-- Regras de lançamentos recorrentes (aluguel, salários, contas de consumo). Os lançamentos
+-- de uma regra são gerados sob demanda por `materialize_recurring()` no app.py, só até o
+-- fim do período consultado; `materialized_until` marca até que dia a regra já foi gerada,
+-- então um lançamento gerado e depois excluído pelo usuário não volta a aparecer.
+
+CREATE TABLE IF NOT EXISTS recurring_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    amount INTEGER NOT NULL, -- Valor em centavos
+    type TEXT NOT NULL, -- 'receita' ou 'despesa'
+    category_id INTEGER NOT NULL,
+    client_id INTEGER,
+    supplier_id INTEGER,
+    frequency TEXT NOT NULL CHECK (frequency IN ('diaria', 'semanal', 'mensal', 'anual')),
+    interval INTEGER NOT NULL DEFAULT 1 CHECK (interval >= 1), -- A cada N períodos
+    start_date TEXT NOT NULL, -- Primeiro vencimento
+    end_date TEXT, -- Último vencimento possível; NULL = sem fim
+    materialized_until TEXT NOT NULL, -- Lançamentos já gerados até esta data (inclusive)
+    FOREIGN KEY (user_id) REFERENCES users (id),
+    FOREIGN KEY (category_id) REFERENCES categories (id),
+    FOREIGN KEY (client_id) REFERENCES clients (id),
+    FOREIGN KEY (supplier_id) REFERENCES suppliers (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_recurring_rules_user ON recurring_rules (user_id, materialized_until);
+CREATE INDEX IF NOT EXISTS idx_recurring_rules_category ON recurring_rules (category_id);
+CREATE INDEX IF NOT EXISTS idx_recurring_rules_client ON recurring_rules (client_id) WHERE client_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_recurring_rules_supplier ON recurring_rules (supplier_id) WHERE supplier_id IS NOT NULL;
+
+ALTER TABLE transactions ADD COLUMN recurring_rule_id INTEGER REFERENCES recurring_rules (id);
+
+-- Um vencimento por regra: gerações concorrentes da mesma janela não duplicam lançamentos.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_recurring_rule
+ON transactions (recurring_rule_id, due_date) WHERE recurring_rule_id IS NOT NULL;
@@ -0,0 +1,100 @@
+-- 0012_contas_e_transferencias.sql
+-- Lançamentos passam a indicar a conta ou o cartão de crédito movimentado e a forma de
+-- pagamento. Uma transferência são dois lançamentos pagos com o mesmo `transfer_id`: uma
+-- despesa na origem e uma receita no destino.
+--
+-- `account_balances` guarda o saldo de cada conta e cartão (lançamentos pagos/recebidos),
+-- mantido pelos gatilhos abaixo a cada inclusão, alteração ou exclusão, de modo que os
+-- saldos são lidos direto, sem somar o histórico. Saldo negativo num cartão é fatura em aberto.
+
+ALTER TABLE transactions ADD COLUMN account_id INTEGER REFERENCES accounts (id);
+ALTER TABLE transactions ADD COLUMN credit_card_id INTEGER REFERENCES credit_cards (id);
+ALTER TABLE transactions ADD COLUMN payment_method_id INTEGER REFERENCES payment_methods (id);
+ALTER TABLE transactions ADD COLUMN transfer_id INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_account ON transactions (account_id) WHERE account_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transactions_credit_card ON transactions (credit_card_id) WHERE credit_card_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transactions_payment_method ON transactions (payment_method_id) WHERE payment_method_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transactions_transfer ON transactions (transfer_id) WHERE transfer_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS account_balances (
+    user_id INTEGER NOT NULL,
+    kind TEXT NOT NULL, -- 'conta' ou 'cartao'
+    ref_id INTEGER NOT NULL, -- accounts.id ou credit_cards.id
+    balance INTEGER NOT NULL DEFAULT 0, -- Centavos
+    PRIMARY KEY (user_id, kind, ref_id)
+) WITHOUT ROWID;
+
+-- Nenhum lançamento existente tem conta ou cartão, então a tabela começa vazia.
+
+CREATE TRIGGER account_balances_after_insert AFTER INSERT ON transactions
+WHEN NEW.status IN ('pago', 'recebido')
+BEGIN
+    INSERT INTO account_balances (user_id, kind, ref_id, balance)
+    SELECT NEW.user_id, 'conta', NEW.account_id, CASE WHEN NEW.type = 'receita' THEN NEW.amount ELSE -NEW.amount END
+    WHERE NEW.account_id IS NOT NULL
+    ON CONFLICT (user_id, kind, ref_id) DO UPDATE SET balance = balance + excluded.balance;
+    INSERT INTO account_balances (user_id, kind, ref_id, balance)
+    SELECT NEW.user_id, 'cartao', NEW.credit_card_id, CASE WHEN NEW.type = 'receita' THEN NEW.amount ELSE -NEW.amount END
+    WHERE NEW.credit_card_id IS NOT NULL
+    ON CONFLICT (user_id, kind, ref_id) DO UPDATE SET balance = balance + excluded.balance;
+END;
+
+CREATE TRIGGER account_balances_after_delete AFTER DELETE ON transactions
+WHEN OLD.status IN ('pago', 'recebido')
+BEGIN
+    UPDATE account_balances SET balance = balance - CASE WHEN OLD.type = 'receita' THEN OLD.amount ELSE -OLD.amount END
+    WHERE user_id = OLD.user_id AND kind = 'conta' AND ref_id = OLD.account_id;
+    UPDATE account_balances SET balance = balance - CASE WHEN OLD.type = 'receita' THEN OLD.amount ELSE -OLD.amount END
+    WHERE user_id = OLD.user_id AND kind = 'cartao' AND ref_id = OLD.credit_card_id;
+END;
+
+CREATE TRIGGER account_balances_after_update
+AFTER UPDATE OF user_id, amount, type, status, account_id, credit_card_id ON transactions
+BEGIN
+    UPDATE account_balances SET balance = balance - CASE WHEN OLD.type = 'receita' THEN OLD.amount ELSE -OLD.amount END
+    WHERE user_id = OLD.user_id AND kind = 'conta' AND ref_id = OLD.account_id AND OLD.status IN ('pago', 'recebido');
+    UPDATE account_balances SET balance = balance - CASE WHEN OLD.type = 'receita' THEN OLD.amount ELSE -OLD.amount END
+    WHERE user_id = OLD.user_id AND kind = 'cartao' AND ref_id = OLD.credit_card_id AND OLD.status IN ('pago', 'recebido');
+    INSERT INTO account_balances (user_id, kind, ref_id, balance)
+    SELECT NEW.user_id, 'conta', NEW.account_id, CASE WHEN NEW.type = 'receita' THEN NEW.amount ELSE -NEW.amount END
+    WHERE NEW.account_id IS NOT NULL AND NEW.status IN ('pago', 'recebido')
+    ON CONFLICT (user_id, kind, ref_id) DO UPDATE SET balance = balance + excluded.balance;
+    INSERT INTO account_balances (user_id, kind, ref_id, balance)
+    SELECT NEW.user_id, 'cartao', NEW.credit_card_id, CASE WHEN NEW.type = 'receita' THEN NEW.amount ELSE -NEW.amount END
+    WHERE NEW.credit_card_id IS NOT NULL AND NEW.status IN ('pago', 'recebido')
+    ON CONFLICT (user_id, kind, ref_id) DO UPDATE SET balance = balance + excluded.balance;
+END;
+
+-- Contas e cartões aparecem no dashboard (em cache): incluir, renomear ou excluir muda a versão dos dados.
+CREATE TRIGGER data_version_after_account_insert AFTER INSERT ON accounts
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER data_version_after_account_rename AFTER UPDATE OF name ON accounts
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER data_version_after_account_delete AFTER DELETE ON accounts
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = OLD.user_id;
+    DELETE FROM account_balances WHERE user_id = OLD.user_id AND kind = 'conta' AND ref_id = OLD.id;
+END;
+
+CREATE TRIGGER data_version_after_credit_card_insert AFTER INSERT ON credit_cards
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER data_version_after_credit_card_rename AFTER UPDATE OF name ON credit_cards
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER data_version_after_credit_card_delete AFTER DELETE ON credit_cards
+BEGIN
+    UPDATE users SET data_version = data_version + 1 WHERE id = OLD.user_id;
+    DELETE FROM account_balances WHERE user_id = OLD.user_id AND kind = 'cartao' AND ref_id = OLD.id;
+END;
@@ -0,0 +1,127 @@
+-- 0013_fechamento_de_exercicio.sql
+-- Fechamento de exercício: `close_fiscal_year()` no app.py grava o saldo de caixa no fim
+-- do ano e os totais por categoria, e move os lançamentos do ano (pela data do pagamento ou,
+-- sem ela, do vencimento) de `transactions` para `transactions_archive`. As rotas do dia a
+-- dia leem só `transactions`; os relatórios usam a visão `all_transactions` apenas quando o
+-- período pedido alcança um exercício fechado.
+--
+-- Novas colunas em `transactions` precisam ser repetidas no arquivo e na visão.
+
+CREATE TABLE IF NOT EXISTS fiscal_closings (
+    user_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    closed_at TEXT NOT NULL,
+    income INTEGER NOT NULL, -- Centavos recebidos no ano
+    expense INTEGER NOT NULL, -- Centavos pagos no ano
+    closing_balance INTEGER NOT NULL, -- Saldo de caixa acumulado em 31/12
+    archived_count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, year),
+    FOREIGN KEY (user_id) REFERENCES users (id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS fiscal_closing_totals (
+    user_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    total INTEGER NOT NULL, -- Centavos
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, year, category_id, type),
+    FOREIGN KEY (category_id) REFERENCES categories (id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS transactions_archive (
+    id INTEGER PRIMARY KEY, -- O mesmo id que o lançamento tinha em transactions
+    user_id INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    category_id INTEGER NOT NULL,
+    date TEXT,
+    due_date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    client_id INTEGER,
+    supplier_id INTEGER,
+    recurring_rule_id INTEGER,
+    account_id INTEGER,
+    credit_card_id INTEGER,
+    payment_method_id INTEGER,
+    transfer_id INTEGER,
+    FOREIGN KEY (user_id) REFERENCES users (id),
+    FOREIGN KEY (category_id) REFERENCES categories (id),
+    FOREIGN KEY (client_id) REFERENCES clients (id),
+    FOREIGN KEY (supplier_id) REFERENCES suppliers (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_archive_user_date ON transactions_archive (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_archive_user_due_date ON transactions_archive (user_id, due_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_archive_category ON transactions_archive (category_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_archive_client ON transactions_archive (client_id) WHERE client_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transactions_archive_supplier ON transactions_archive (supplier_id) WHERE supplier_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transactions_archive_account ON transactions_archive (account_id) WHERE account_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transactions_archive_credit_card ON transactions_archive (credit_card_id) WHERE credit_card_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transactions_archive_payment_method ON transactions_archive (payment_method_id) WHERE payment_method_id IS NOT NULL;
+
+CREATE VIEW IF NOT EXISTS all_transactions AS
+SELECT id, user_id, description, amount, type, category_id, date, due_date, status, client_id, supplier_id,
+       recurring_rule_id, account_id, credit_card_id, payment_method_id, transfer_id
+FROM transactions
+UNION ALL
+SELECT id, user_id, description, amount, type, category_id, date, due_date, status, client_id, supplier_id,
+       recurring_rule_id, account_id, credit_card_id, payment_method_id, transfer_id
+FROM transactions_archive;
+
+-- Enquanto um usuário está nesta tabela (só dentro da transação do fechamento), a exclusão
+-- dos seus lançamentos é um arquivamento: o resumo mensal, os pontos de controle do caixa
+-- e os saldos das contas continuam valendo e não são descontados.
+CREATE TABLE IF NOT EXISTS archiving_users (
+    user_id INTEGER PRIMARY KEY
+);
+
+DROP TRIGGER IF EXISTS monthly_summary_after_delete;
+CREATE TRIGGER monthly_summary_after_delete AFTER DELETE ON transactions
+WHEN NOT EXISTS (SELECT 1 FROM archiving_users WHERE user_id = OLD.user_id)
+BEGIN
+    UPDATE monthly_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category_id = OLD.category_id;
+    DELETE FROM monthly_summary
+    WHERE user_id = OLD.user_id AND month = substr(COALESCE(OLD.date, OLD.due_date), 1, 7)
+      AND type = OLD.type AND status = OLD.status AND category_id = OLD.category_id AND count <= 0;
+END;
+
+DROP TRIGGER IF EXISTS balance_checkpoints_after_delete;
+CREATE TRIGGER balance_checkpoints_after_delete AFTER DELETE ON transactions
+WHEN OLD.date IS NOT NULL AND NOT EXISTS (SELECT 1 FROM archiving_users WHERE user_id = OLD.user_id)
+BEGIN
+    DELETE FROM balance_checkpoints WHERE user_id = OLD.user_id AND month >= substr(OLD.date, 1, 7);
+END;
+
+DROP TRIGGER IF EXISTS account_balances_after_delete;
+CREATE TRIGGER account_balances_after_delete AFTER DELETE ON transactions
+WHEN OLD.status IN ('pago', 'recebido') AND NOT EXISTS (SELECT 1 FROM archiving_users WHERE user_id = OLD.user_id)
+BEGIN
+    UPDATE account_balances SET balance = balance - CASE WHEN OLD.type = 'receita' THEN OLD.amount ELSE -OLD.amount END
+    WHERE user_id = OLD.user_id AND kind = 'conta' AND ref_id = OLD.account_id;
+    UPDATE account_balances SET balance = balance - CASE WHEN OLD.type = 'receita' THEN OLD.amount ELSE -OLD.amount END
+    WHERE user_id = OLD.user_id AND kind = 'cartao' AND ref_id = OLD.credit_card_id;
+END;
+
+-- Exercício fechado não recebe lançamentos: nem novos, nem alterados para uma data dele.
+CREATE TRIGGER transactions_closed_period_insert BEFORE INSERT ON transactions
+WHEN EXISTS (
+    SELECT 1 FROM fiscal_closings
+    WHERE user_id = NEW.user_id AND year >= CAST(substr(COALESCE(NEW.date, NEW.due_date), 1, 4) AS INTEGER)
+)
+BEGIN
+    SELECT RAISE(ABORT, 'Exercício fechado');
+END;
+
+CREATE TRIGGER transactions_closed_period_update BEFORE UPDATE OF user_id, date, due_date ON transactions
+WHEN EXISTS (
+    SELECT 1 FROM fiscal_closings
+    WHERE user_id = NEW.user_id AND year >= CAST(substr(COALESCE(NEW.date, NEW.due_date), 1, 4) AS INTEGER)
+)
+BEGIN
+    SELECT RAISE(ABORT, 'Exercício fechado');
+END;
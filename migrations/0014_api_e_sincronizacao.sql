@@ -0,0 +1,37 @@
+-- 0014_api_e_sincronizacao.sql
+-- API JSON (/api/v1): tokens de acesso por usuário e a data da última alteração de cada
+-- lançamento, usada pelo cursor `updated_since` da sincronização incremental.
+--
+-- Só o hash SHA-256 do token é gravado; o token em si é mostrado uma única vez por
+-- `flask create-api-token`.
+
+CREATE TABLE IF NOT EXISTS api_tokens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    token_hash TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL,
+    UNIQUE (user_id, name),
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+
+-- Instante UTC com milissegundos ('AAAA-MM-DDTHH:MM:SS.sssZ'), que ordena como texto.
+-- Não vai para transactions_archive: exercícios fechados não mudam mais.
+ALTER TABLE transactions ADD COLUMN updated_at TEXT;
+
+UPDATE transactions SET updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now');
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_updated_at ON transactions (user_id, updated_at, id);
+
+-- ALTER TABLE não aceita DEFAULT com expressão, então os gatilhos preenchem a coluna.
+CREATE TRIGGER transactions_updated_at_after_insert AFTER INSERT ON transactions
+WHEN NEW.updated_at IS NULL
+BEGIN
+    UPDATE transactions SET updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER transactions_updated_at_after_update AFTER UPDATE ON transactions
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE transactions SET updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE id = NEW.id;
+END;
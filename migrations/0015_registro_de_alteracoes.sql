@@ -0,0 +1,175 @@
+-- 0015_registro_de_alteracoes.sql
+-- Registro de alterações para sincronização incremental. Cada inclusão, alteração ou
+-- exclusão de lançamento e cada inclusão, renomeação ou exclusão de cadastro grava uma
+-- linha em `changes`, pelos gatilhos abaixo e portanto na mesma transação da escrita
+-- (rotas, lote, importação, recorrências, fechamento). `seq` é crescente: o cliente lê
+-- /api/v1/changes?since=<último seq> e recebe só o que mudou desde então.
+--
+-- Lançamentos ganham `version` (1 na inclusão, +1 a cada alteração) e `created_at`. O
+-- arquivamento no fechamento de exercício entra como op 'archive', e não 'delete'.
+
+ALTER TABLE transactions ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE transactions ADD COLUMN created_at TEXT;
+
+UPDATE transactions SET created_at = updated_at;
+
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    entity TEXT NOT NULL, -- Tabela alterada ('transactions', 'categories', 'clients', ...)
+    entity_id INTEGER NOT NULL,
+    op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete', 'archive')),
+    version INTEGER, -- Versão do lançamento após a alteração; NULL nos cadastros
+    changed_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_changes_user_seq ON changes (user_id, seq);
+
+-- O registro começa com o estado atual, para que um cliente novo sincronize a partir de since=0.
+INSERT INTO changes (user_id, entity, entity_id, op, changed_at)
+SELECT user_id, 'categories', id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM categories ORDER BY id;
+INSERT INTO changes (user_id, entity, entity_id, op, changed_at)
+SELECT user_id, 'clients', id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM clients ORDER BY id;
+INSERT INTO changes (user_id, entity, entity_id, op, changed_at)
+SELECT user_id, 'suppliers', id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM suppliers ORDER BY id;
+INSERT INTO changes (user_id, entity, entity_id, op, changed_at)
+SELECT user_id, 'accounts', id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM accounts ORDER BY id;
+INSERT INTO changes (user_id, entity, entity_id, op, changed_at)
+SELECT user_id, 'credit_cards', id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM credit_cards ORDER BY id;
+INSERT INTO changes (user_id, entity, entity_id, op, changed_at)
+SELECT user_id, 'payment_methods', id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM payment_methods ORDER BY id;
+INSERT INTO changes (user_id, entity, entity_id, op, changed_at)
+SELECT user_id, 'recurring_rules', id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM recurring_rules ORDER BY id;
+INSERT INTO changes (user_id, entity, entity_id, op, version, changed_at)
+SELECT user_id, 'transactions', id, 'insert', version, strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM transactions ORDER BY id;
+
+-- Substituem os gatilhos de `updated_at` da migração 0014. A alteração interna de
+-- `updated_at`/`version` não dispara de novo o gatilho de alteração (WHEN abaixo).
+DROP TRIGGER IF EXISTS transactions_updated_at_after_insert;
+DROP TRIGGER IF EXISTS transactions_updated_at_after_update;
+
+CREATE TRIGGER transactions_changes_after_insert AFTER INSERT ON transactions
+BEGIN
+    UPDATE transactions SET created_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+    WHERE id = NEW.id AND updated_at IS NULL;
+    INSERT INTO changes (user_id, entity, entity_id, op, version, changed_at)
+    VALUES (NEW.user_id, 'transactions', NEW.id, 'insert', NEW.version, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER transactions_changes_after_update AFTER UPDATE ON transactions
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE transactions SET updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), version = OLD.version + 1 WHERE id = NEW.id;
+    INSERT INTO changes (user_id, entity, entity_id, op, version, changed_at)
+    VALUES (NEW.user_id, 'transactions', NEW.id, 'update', OLD.version + 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER transactions_changes_after_delete AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, version, changed_at)
+    VALUES (
+        OLD.user_id, 'transactions', OLD.id,
+        CASE WHEN EXISTS (SELECT 1 FROM archiving_users WHERE user_id = OLD.user_id) THEN 'archive' ELSE 'delete' END,
+        OLD.version, strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+    );
+END;
+
+CREATE TRIGGER changes_after_category_insert AFTER INSERT ON categories
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'categories', NEW.id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_category_rename AFTER UPDATE OF name ON categories
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'categories', NEW.id, 'update', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_category_delete AFTER DELETE ON categories
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (OLD.user_id, 'categories', OLD.id, 'delete', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_client_insert AFTER INSERT ON clients
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'clients', NEW.id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_client_rename AFTER UPDATE OF name ON clients
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'clients', NEW.id, 'update', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_client_delete AFTER DELETE ON clients
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (OLD.user_id, 'clients', OLD.id, 'delete', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_supplier_insert AFTER INSERT ON suppliers
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'suppliers', NEW.id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_supplier_rename AFTER UPDATE OF name ON suppliers
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'suppliers', NEW.id, 'update', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_supplier_delete AFTER DELETE ON suppliers
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (OLD.user_id, 'suppliers', OLD.id, 'delete', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_account_insert AFTER INSERT ON accounts
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'accounts', NEW.id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_account_rename AFTER UPDATE OF name ON accounts
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'accounts', NEW.id, 'update', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_account_delete AFTER DELETE ON accounts
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (OLD.user_id, 'accounts', OLD.id, 'delete', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_credit_card_insert AFTER INSERT ON credit_cards
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'credit_cards', NEW.id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_credit_card_rename AFTER UPDATE OF name ON credit_cards
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'credit_cards', NEW.id, 'update', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_credit_card_delete AFTER DELETE ON credit_cards
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (OLD.user_id, 'credit_cards', OLD.id, 'delete', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_payment_method_insert AFTER INSERT ON payment_methods
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'payment_methods', NEW.id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_payment_method_rename AFTER UPDATE OF name ON payment_methods
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'payment_methods', NEW.id, 'update', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_payment_method_delete AFTER DELETE ON payment_methods
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (OLD.user_id, 'payment_methods', OLD.id, 'delete', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_recurring_rule_insert AFTER INSERT ON recurring_rules
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (NEW.user_id, 'recurring_rules', NEW.id, 'insert', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER changes_after_recurring_rule_delete AFTER DELETE ON recurring_rules
+BEGIN
+    INSERT INTO changes (user_id, entity, entity_id, op, changed_at) VALUES (OLD.user_id, 'recurring_rules', OLD.id, 'delete', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
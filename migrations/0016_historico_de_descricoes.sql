@@ -0,0 +1,6 @@
+-- 0016_historico_de_descricoes.sql
+-- A importação de extratos sugere categoria e cliente/fornecedor pelo último lançamento
+-- com a mesma descrição. Este índice deixa buscar só as descrições de cada lote, em vez
+-- de ler todo o histórico do usuário a cada importação.
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_description ON transactions (user_id, lower(description), due_date);
@@ -0,0 +1,26 @@
+-- 0017_fechamento_sem_transferencias.sql
+-- Receitas, despesas e totais por categoria dos exercícios fechados deixam de contar as
+-- transferências entre contas, como o dashboard. Os exercícios já fechados são refeitos a
+-- partir de `transactions_archive`; cada um arquivou só os lançamentos do seu ano. O saldo
+-- final não muda, pois as duas pernas de uma transferência se anulam.
+
+UPDATE fiscal_closings SET
+    income = (
+        SELECT COALESCE(SUM(a.amount), 0) FROM transactions_archive a
+        WHERE a.user_id = fiscal_closings.user_id AND substr(a.date, 1, 4) = printf('%04d', fiscal_closings.year)
+          AND a.type = 'receita' AND a.transfer_id IS NULL
+    ),
+    expense = (
+        SELECT COALESCE(SUM(a.amount), 0) FROM transactions_archive a
+        WHERE a.user_id = fiscal_closings.user_id AND substr(a.date, 1, 4) = printf('%04d', fiscal_closings.year)
+          AND a.type = 'despesa' AND a.transfer_id IS NULL
+    );
+
+DELETE FROM fiscal_closing_totals;
+
+INSERT INTO fiscal_closing_totals (user_id, year, category_id, type, total, count)
+SELECT f.user_id, f.year, a.category_id, a.type, SUM(a.amount), COUNT(*)
+FROM fiscal_closings f
+JOIN transactions_archive a ON a.user_id = f.user_id AND substr(a.date, 1, 4) = printf('%04d', f.year)
+WHERE a.transfer_id IS NULL
+GROUP BY f.user_id, f.year, a.category_id, a.type;
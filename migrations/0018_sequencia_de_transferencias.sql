@@ -0,0 +1,15 @@
+-- 0018_sequencia_de_transferencias.sql
+-- Sequência dos identificadores de transferência (`transfer_id`). Cada transferência
+-- insere uma linha e usa o id gerado; a linha é apagada em seguida, pois o AUTOINCREMENT
+-- guarda o último valor em sqlite_sequence e nunca repete um id, nem de lançamentos já
+-- arquivados no fechamento de exercício.
+
+CREATE TABLE IF NOT EXISTS transfer_sequence (
+    id INTEGER PRIMARY KEY AUTOINCREMENT
+);
+
+-- Começa depois do maior transfer_id já usado, em aberto ou no arquivo.
+INSERT INTO transfer_sequence (id)
+SELECT MAX(transfer_id) FROM all_transactions HAVING MAX(transfer_id) IS NOT NULL;
+
+DELETE FROM transfer_sequence;
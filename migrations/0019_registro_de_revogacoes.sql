@@ -0,0 +1,13 @@
+-- 0019_registro_de_revogacoes.sql
+-- Revogações de sessão por usuário, no lugar do contador global `auth_state`. Cada worker
+-- lê, no máximo uma vez por segundo, as revogações posteriores à última que viu e descarta
+-- do seu cache só os usuários afetados. Linhas com mais de um dia são apagadas pela
+-- própria revogação: o cache de sessões expira bem antes disso.
+
+CREATE TABLE IF NOT EXISTS session_revocations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    revoked_at TEXT NOT NULL
+);
+
+DROP TABLE IF EXISTS auth_state;